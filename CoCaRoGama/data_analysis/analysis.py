@@ -1,51 +1,40 @@
-# data format
-# cycle,mean_battery,box_count,alive_robots,robot_type
+# data format (GAMA export, no header, seed column only in newer exports)
+# cycle,mean_battery,box_count,alive_robots,robot_type[,seed]
 # 10,298.5,45,89,random
 # 20,295.2,52,87,random
 # 10,299.1,43,90,greedy
 # 20,297.8,38,89,greedy
+#
+# The CSV is imported into the shared columnar result store (see CoCaRoMesa/result_store.py).
+# Runs are then streamed one at a time into running per-(robot_type, cycle) statistics
+# (see CoCaRoMesa/aggregation.py), so memory stays flat whatever the number of replicates.
 
 
 import os
-import pandas as pd
+import sys
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'CoCaRoMesa'))
+from aggregation import ReplicateAggregator, plot_bands
+from result_store import ResultStore, import_gama_csv
 
 
-df = pd.read_csv('CoCaRoGama/data_analysis/data_python.csv', names=['cycle', 'battery', 'boxes', 'alive', 'type'])
+store = ResultStore('CoCaRoGama/data_analysis/results_store')
+import_gama_csv('CoCaRoGama/data_analysis/data_python.csv', store)
 
+metrics = [
+    ('mean_battery', 'Mean Battery Level'),
+    ('box_count', 'Boxes in Environment'),
+    ('alive_robots', 'Alive Robots in Environment'),
+]
+aggregator = ReplicateAggregator([metric for metric, _ in metrics])
+for robot_type, run_id, columns in store.iter_runs(columns=['step'] + aggregator.metrics):
+    aggregator.add_run(robot_type, columns)
 
-print("Robot types in data:", df['type'].unique())
-print("Data counts per type:")
-print(df['type'].value_counts())
-print("\nFirst few rows:")
-print(df.head(10))
+print("Runs per robot type:", aggregator.run_count)
+print("\nSummary over replicates:")
+print(aggregator.summary_table().to_string(index=False))
 
-fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 12))
-
-# Plot battery levels
-for robot_type, color in [('rl', 'red'), ('greedy', 'green'), ('cooperative', 'blue'), ('saphesia', 'black')]:
-    data = df[df['type'] == robot_type]
-    ax1.plot(data['cycle'], data['battery'], color=color, label=robot_type)
-ax1.set_ylabel('Mean Battery Level')
-ax1.legend()
-
-# Plot box counts
-for robot_type, color in [('rl', 'red'), ('greedy', 'green'), ('cooperative', 'blue'), ('saphesia', 'black')]:
-    data = df[df['type'] == robot_type]
-    ax2.plot(data['cycle'], data['boxes'], color=color, label=robot_type)
-ax2.set_ylabel('Boxes in Environment')
-ax2.legend()
-
-# Plot alive robots
-for robot_type, color in [('rl', 'red'), ('greedy', 'green'), ('cooperative', 'blue'), ('saphesia', 'black')]:
-    data = df[df['type'] == robot_type]
-    ax3.plot(data['cycle'], data['alive'], color=color, label=robot_type)
-ax3.set_ylabel('Alive Robots in Environment')
-ax3.set_xlabel('Cycle')
-ax3.legend()
-
-plt.tight_layout()
+colors = {'RL': 'red', 'GREEDY': 'green', 'COOPERATIVE': 'blue', 'SAPHESIA': 'black'}
+plot_bands(aggregator, metrics, colors, xlabel='Cycle')
 plt.show()
-
-
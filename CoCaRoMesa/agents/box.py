@@ -1,9 +1,24 @@
-from mesa.discrete_space import CellAgent
+from .tracked_agent import TrackedCellAgent
 
 #   ===== BOX =====
-class Box(CellAgent):
+class Box(TrackedCellAgent):
+    __slots__ = ("color", "owner", "holders")
+
     def __init__(self, model, color, cell):
         super().__init__(model)
         self.color = color
         self.cell = cell
-        self.owner = None
\ No newline at end of file
+        self.owner = None
+        # robots targeting or carrying this box, kept by RobotBase (dict used as an ordered set)
+        self.holders = {}
+
+    @property
+    def cell(self):
+        return self._mesa_cell
+
+    @cell.setter
+    def cell(self, cell):
+        """Move the box and keep the model's box index in sync"""
+        old_cell = self._mesa_cell
+        TrackedCellAgent.cell.fset(self, cell)
+        self.model.box_index.move(self, old_cell, cell)
\ No newline at end of file
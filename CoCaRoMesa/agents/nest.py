@@ -1,7 +1,9 @@
-from mesa.discrete_space import CellAgent
+from .tracked_agent import TrackedCellAgent
 
 #   ===== NEST =====
-class Nest(CellAgent):
+class Nest(TrackedCellAgent):
+    __slots__ = ("color",)
+
     def __init__(self, model, color, cell):
         super().__init__(model)
         self.color = color
@@ -1,38 +1,83 @@
-from mesa.discrete_space import CellAgent
+import numpy as np
 
 
-from .box import Box
-from .nest import Nest
+from .tracked_agent import TrackedCellAgent
 from .utils import manhattan
 
 #  ===== ROBOT BASE CLASS =====
-class RobotBase(CellAgent):
+class RobotBase(TrackedCellAgent):
+    __slots__ = ("color", "vision_range", "reachable_boxes", "_targeted_box", "_carried_box", "target_nest",
+                 "previous_cell", "_battery", "_criticality")
+
+    # constants shared by every robot
+    wander_amplitude = 3  # How far to wander (like GAMA)
+    # movement_speed = 1    # How many cells to move per step
+    # battery related
+    max_battery = 300
+    min_battery = 0
+    initial_battery = max_battery
+    battery_consum = 1
+    # reward related
+    reward = 2 * max_battery / 3  # two-third of max energy
+    reduced_reward = max_battery / 3  # one-third of max energy
+    # criticality related
+    max_criticality = max_battery
+    min_criticality = min_battery
+
     def __init__(self, model, color, cell, vision_range=3):
         super().__init__(model)
         self.color = color
         self.cell = cell
         self.vision_range = vision_range
         self.reachable_boxes = []
-        self.targeted_box = None
-        self.carried_box = None
+        self._targeted_box = None
+        self._carried_box = None
         self.target_nest = None
-        self.wander_amplitude = 3  # How far to wander (like GAMA)
-        # self.movement_speed = 1    # How many cells to move per step
         self.previous_cell = None  # Remember where we came from
-        # battery related
-        self.max_battery = 300
-        self.min_battery = 0
-        self.initial_battery = self.max_battery
-        self.battery_consum = 1
         self._battery = self.initial_battery
-        # reward related
-        self.reward = 2 * self.max_battery / 3  # two-third of max energy
-        self.reduced_reward = self.max_battery / 3  # one-third of max energy
-        # criticality related
-        self.max_criticality = self.max_battery
-        self.min_criticality = self.min_battery
+        self.model.metrics.add_robot(self._battery)
         self._criticality = 0
 
+    @property
+    def targeted_box(self):
+        return self._targeted_box
+
+    @targeted_box.setter
+    def targeted_box(self, box):
+        """Set the targeted box, keeping the box's holders up to date"""
+        old_box = self._targeted_box
+        if old_box is box:
+            return
+        self._targeted_box = box
+        if box is not None:
+            box.holders[self] = None
+        if old_box is not None:
+            self._release_box(old_box)
+
+    @property
+    def carried_box(self):
+        return self._carried_box
+
+    @carried_box.setter
+    def carried_box(self, box):
+        """Set the carried box, keeping the box's holders up to date"""
+        old_box = self._carried_box
+        if old_box is box:
+            return
+        self._carried_box = box
+        if box is not None:
+            box.holders[self] = None
+        if old_box is not None:
+            self._release_box(old_box)
+
+    def _release_box(self, box):
+        """Forget box once it is neither targeted nor carried, and give up its ownership"""
+        if box is self._targeted_box or box is self._carried_box:
+            return
+        box.holders.pop(self, None)
+        if box.owner is self:
+            box.owner = None
+
     @property
     def battery(self):
         """Battery property with automatic constraint enforcement"""
@@ -46,7 +91,9 @@ class RobotBase(CellAgent):
     @battery.setter
     def battery(self, value):
         """Set battery value with min/max constraints enforced"""
+        old_battery = self._battery
         self._battery = max(self.min_battery, min(self.max_battery, int(value)))
+        self.model.metrics.battery_changed(old_battery, self._battery)
 
     @criticality.setter
     def criticality(self, value):
@@ -80,8 +127,7 @@ class RobotBase(CellAgent):
         self.criticality = self.max_criticality - self.battery
 
     def update_reachable_boxes(self):
-        neighborhood = self.cell.get_neighborhood(radius=self.vision_range, include_center=False)
-        self.reachable_boxes = [agent for agent in neighborhood.agents if isinstance(agent, Box)]
+        self.reachable_boxes = self.model.box_index.boxes_within(self.cell, self.vision_range)
         # box_data = [f'{b.unique_id} ({b.color}) at {b.cell.coordinate}' for b in self.reachable_boxes]
         # print(box_data)
 
@@ -91,12 +137,13 @@ class RobotBase(CellAgent):
         if self.targeted_box or self.target_nest or self.battery <= self.min_battery:
             return
 
-        # Get all neighbors except the previous cell
-        neighbors = [cell for cell in self.cell.neighborhood if cell != self.previous_cell]
+        # Get all passable neighbors except the previous cell
+        passable = self.model.navigation.neighbors(self.cell)
+        neighbors = [cell for cell in passable if cell != self.previous_cell]
 
         # If no valid neighbors (trapped), then allow going back
         if not neighbors:
-            neighbors = list(self.cell.neighborhood)
+            neighbors = list(passable)
 
         if neighbors:
             self.previous_cell = self.cell
@@ -113,17 +160,25 @@ class RobotBase(CellAgent):
 
     def go_to_target_box(self):
         if self.targeted_box and self.battery > self.min_battery:
-            target_coord = self.targeted_box.cell.coordinate
-            if self._move_towards_target(target_coord):
-                print(f'Robot {self.unique_id} reached target box {self.targeted_box.unique_id}!')
-            else:
-                print('moving towards target box')
+            reached = self._move_towards_target(self.targeted_box.cell)
+            if reached is None:
+                # unreachable (on or walled in by blocked cells): give it up instead of standing still
+                if self.targeted_box.owner is self:
+                    self.targeted_box.owner = None
+                self.targeted_box = None
+                return
+            log = self.model.event_log
+            if log.debug:
+                log.emit(log.DEBUG, "reached_box" if reached else "move_to_box", self,
+                         box=self.targeted_box.unique_id)
 
     def take_box(self):  # aka pickup box
         if self.targeted_box and self.targeted_box.cell.coordinate == self.cell.coordinate and self.battery > self.min_battery:
             self.carried_box = self.targeted_box
             self.targeted_box = None
-            print('picked up the box')
+            log = self.model.event_log
+            if log.info:
+                log.emit(log.INFO, "take_box", self, box=self.carried_box.unique_id)
 
     def carry_box_to_nest(self):
         if not self.carried_box or self.battery <= self.min_battery:
@@ -131,16 +186,23 @@ class RobotBase(CellAgent):
 
         if self.carried_box in self.model.agents:
             # Find closest suitable nest
-            matching_nests = [nest for nest in self.model.agents_by_type[Nest] if nest.color == self.carried_box.color]
-            if matching_nests:
-                self.target_nest = matching_nests[0]
+            matching_nest = self.model.nest_by_color.get(self.carried_box.color)
+            if matching_nest:
+                self.target_nest = matching_nest
 
             if self.target_nest:
-                target_coord = self.target_nest.cell.coordinate
-                if self._move_towards_target(target_coord):
-                    print(f'Robot {self.unique_id} reached {self.carried_box.color} nest!')
-                else:
-                    print(f'carrying {self.carried_box.color} box to nest')
+                reached = self._move_towards_target(self.target_nest.cell)
+                if reached is None:
+                    # nest walled in by blocked cells: drop the box here instead of standing still
+                    if self.carried_box.owner is self:
+                        self.carried_box.owner = None
+                    self.carried_box = None
+                    self.target_nest = None
+                    return
+                log = self.model.event_log
+                if log.debug:
+                    log.emit(log.DEBUG, "reached_nest" if reached else "carry_to_nest", self,
+                             box=self.carried_box.unique_id, color=self.carried_box.color)
         else:
             # box is dead
             self.carried_box = None
@@ -157,18 +219,20 @@ class RobotBase(CellAgent):
 
                 box_to_remove = self.carried_box
 
-                # clear all agents' references to this box
-                for agent in self.model.agents:
-                    if hasattr(agent, "targeted_box") and agent.targeted_box == box_to_remove:
-                        agent.targeted_box = None
-                    if hasattr(agent, "carried_box") and agent.carried_box == box_to_remove:
-                        agent.carried_box = None
+                # clear the references of the robots targeting or carrying this box
+                for robot in list(box_to_remove.holders):
+                    if robot.targeted_box is box_to_remove:
+                        robot.targeted_box = None
+                    if robot.carried_box is box_to_remove:
+                        robot.carried_box = None
 
                 # kill the box (remove from the model)
                 box_to_remove.remove()
                 self.carried_box = None
                 self.target_nest = None
-                print('box deposited into nest!')
+                log = self.model.event_log
+                if log.info:
+                    log.emit(log.INFO, "drop_box", self, box=box_to_remove.unique_id, battery=self.battery)
 
     def die(self):
         if self.battery <= self.min_battery:
@@ -179,43 +243,41 @@ class RobotBase(CellAgent):
                 self.targeted_box.owner = None
                 self.targeted_box = None
             self.color = 'gray'
+            # dead for good: no battery, no reward, the scheduler stops stepping it
+            self.model.active_robots.discard(self)
 
     def _colors_reward_efficiency(self, box_color):
         resp = self.reward if box_color == self.color else self.reduced_reward
-        print('box color', box_color, 'robot color', self.color, 'reward', resp)
+        log = self.model.event_log
+        if log.debug:
+            log.emit(log.DEBUG, "reward", self, box_color=box_color, color=self.color, reward=resp)
         return resp
 
-    def _move_towards_target(self, target_coord):
-        """Move one step towards target coordinate"""
-        current_coord = self.cell.coordinate
+    def _move_towards_target(self, target_cell):
+        """Move one step towards target cell, along a shortest path around blocked cells
+
+        Returns True once at the target, False after a step, None if the
+        target cannot be reached.
+        """
         # Check if already at target
-        if current_coord == target_coord:
+        if self.cell is target_cell:
             return True  # Reached target
 
-        # Move towards target
-        neighbors = list(self.cell.neighborhood)
-        if neighbors:
-            # Find ALL neighbors with minimum distance (not just first one)
-            distances = [(cell, manhattan(cell.coordinate, target_coord)) for cell in neighbors]
-            min_distance = min(distances, key=lambda x: x[1])[1]
-            best_neighbors = [cell for cell, dist in distances if dist == min_distance]
+        # ALL neighbors one step closer (not just first one), from the model's next-hop tables
+        best_neighbors = self.model.navigation.next_hops(self.cell, target_cell)
+        if best_neighbors:
             # Remember current position before moving
             self.previous_cell = self.cell
             # Randomly pick among equally good neighbors
             self.cell = self.random.choice(best_neighbors)
             return False  # Still moving
 
-        return False  # No neighbors, can't move
+        return None  # Target unreachable, can't move
 
     def _compute_anticipated_criticality(self, box_to_take):
         dist_box_to_me = manhattan(self.cell.coordinate, box_to_take.cell.coordinate)
-        nest_cell = None
-        # Find closest suitable nest
-        matching_nests = [nest for nest in self.model.agents_by_type[Nest] if nest.color == box_to_take.color]
-        if matching_nests:
-            nest_cell = matching_nests[0]
-
-        dist_box_to_nest = manhattan(box_to_take.cell.coordinate, nest_cell.cell.coordinate)
+        # precomputed distance field of the suitable nest
+        dist_box_to_nest = self.model.nest_distance(box_to_take.color, box_to_take.cell.coordinate)
         anticipated_battery_before_reward = self.battery - (dist_box_to_me + dist_box_to_nest) * self.battery_consum
 
         if anticipated_battery_before_reward < 0:
@@ -239,3 +301,49 @@ class RobotBase(CellAgent):
         else:  # anticipated_battery <= 0 (but robot survived the mission)
             return self.max_criticality
 
+    def _compute_anticipated_criticalities(self, boxes):
+        """Anticipated criticality of every box in boxes, as a NumPy vector"""
+        box_coords = np.array([box.cell.coordinate for box in boxes], dtype=np.int64).reshape(-1, 2)
+        box_colors = np.array([self.model.color_index[box.color] for box in boxes], dtype=np.int64)
+        return self._anticipated_criticalities(box_coords, box_colors)
+
+    def _anticipated_criticalities(self, box_coords, box_colors):
+        """Vectorized _compute_anticipated_criticality
+
+        box_coords is an (n, 2) array of box coordinates and box_colors the
+        matching color indices in model.color_index. Applies the same piecewise
+        rules as the scalar version, for the robot's current cell and battery.
+        """
+        x, y = self.cell.coordinate
+        dist_box_to_me = np.abs(box_coords[:, 0] - x) + np.abs(box_coords[:, 1] - y)
+        dist_box_to_nest = self.model.nest_distance_fields[box_colors, box_coords[:, 0], box_coords[:, 1]]
+        return self.anticipated_criticality(self.battery, dist_box_to_me, dist_box_to_nest,
+                                            self._full_reward(box_colors))
+
+    def _full_reward(self, box_colors):
+        """Which of the color indices box_colors earn the full reward, as _colors_reward_efficiency"""
+        my_color = self.model.color_index.get(self.color, -1)  # dead robots are gray
+        return box_colors == my_color
+
+    @classmethod
+    def anticipated_criticality(cls, battery, dist_box_to_me, dist_box_to_nest, same_color):
+        """Piecewise anticipated criticality rules on NumPy arrays, broadcast over robots and boxes"""
+        anticipated_battery_before_reward = np.maximum(
+            battery - (dist_box_to_me + dist_box_to_nest) * cls.battery_consum, 0
+        )
+        rewards = np.where(same_color, cls.reward, cls.reduced_reward)
+        anticipated_battery = anticipated_battery_before_reward + rewards
+
+        return np.select(
+            [
+                anticipated_battery_before_reward <= 0,  # Robot dies during the mission
+                (cls.min_battery < anticipated_battery) & (anticipated_battery < cls.max_battery),
+                anticipated_battery >= cls.max_battery,
+            ],
+            [
+                cls.max_criticality,
+                cls.max_criticality - anticipated_battery,
+                cls.min_criticality,
+            ],
+            default=cls.max_criticality,  # anticipated_battery <= 0 (but robot survived the mission)
+        ).astype(np.float64)
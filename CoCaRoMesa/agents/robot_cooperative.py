@@ -1,9 +1,6 @@
-from collections import namedtuple
-
 from .robot_base import RobotBase
 
 #  ===== ROBOT Cooperative =====
-Message = namedtuple("Message", ["sender", "performative", "content"])
 
 class RobotCooperative(RobotBase):
     # Message content constants
@@ -12,11 +9,16 @@ class RobotCooperative(RobotBase):
     GIVE_MY_BOX_STRING = "GiveMyBoxToYou"
     REFUSE_STRING = "Ko"
 
-    # Performative constants
-    REQUEST = "request"
-    AGREE = "agree"
-    REFUSE = "refuse"
-    INFORM = "inform"
+    # Performative codes, also the index of the matching inbox in self.inboxes
+    REQUEST = 0
+    AGREE = 1
+    REFUSE = 2
+    INFORM = 3
+
+    need_box_threshold = RobotBase.max_criticality / 2  # todo: why??
+
+    __slots__ = ("requests", "agrees", "refuses", "informs", "inboxes", "box_reserved",
+                 "is_request_criticality_last_cycle")
 
     def __init__(self, model, color, cell, vision_range=3):
         super().__init__(model, color, cell, vision_range)
@@ -25,8 +27,8 @@ class RobotCooperative(RobotBase):
         self.agrees = []
         self.refuses = []
         self.informs = []
+        self.inboxes = (self.requests, self.agrees, self.refuses, self.informs)
         self.box_reserved = False
-        self.need_box_threshold = self.max_criticality / 2  # todo: why??
         self.is_request_criticality_last_cycle = False
 
     @property
@@ -37,60 +39,43 @@ class RobotCooperative(RobotBase):
         if not self.reachable_boxes or self.battery <= self.min_battery:
             return
 
-        for bx in self.reachable_boxes:
-            message_sent = False
-            ant_reach_crit = self._compute_anticipated_criticality(bx)
+        criticalities = self._compute_anticipated_criticalities(self.reachable_boxes).tolist()
+        # criticality of the box I'm carrying or targetting, None if neither
+        focus_box = self.carried_box if self.carried_box is not None else self.targeted_box
+        focus_crit = self._compute_anticipated_criticality(focus_box) if focus_box is not None else None
+
+        best_free_box = None
+        for bx, ant_reach_crit in zip(self.reachable_boxes, criticalities):
+            better_than_focus = focus_crit is None or ant_reach_crit < focus_crit
             if bx.owner is None:
-                if self.carried_box is None:    # i am not carrying a box
-                    if self.targeted_box is None:   # neither carrying nor targetting
-                        self.targeted_box = bx
-                        self.targeted_box.owner = self
-                    else:   # not carrying but targetting
-                        my_target_box_crit = self._compute_anticipated_criticality(self.targeted_box)
-                        if ant_reach_crit < my_target_box_crit:    # check if this is a better box
-                            self.targeted_box.owner = None
-                            self.targeted_box = bx
-                            self.targeted_box.owner = self
-                else:   # I am carrying a box
-                    my_carried_box_crit = self._compute_anticipated_criticality(self.carried_box)
-                    if ant_reach_crit < my_carried_box_crit:  # check if this is a better box
-                        # drop the current box
-                        self.carried_box.owner = None
-                        self.carried_box = None
-                        # target the new better box
-                        self.targeted_box = bx
-                        self.targeted_box.owner = self
-            else:   # box has an owner
-                if bx.owner != self and not message_sent:  # check if i am not the owner
-                    if self.carried_box is None:  # i dont carry a box
-                        if self.targeted_box is None:  # neither carrying nor targetting
-                            self._send(
-                                to_id=bx.owner.unique_id,
-                                performative=self.REQUEST,
-                                content=[self.CRITICALITY_STRING, ant_reach_crit, self.criticality]
-                            )
-                        else:   # not carrying but targetting
-                            my_target_box_crit = self._compute_anticipated_criticality(self.targeted_box)
-                            if ant_reach_crit < my_target_box_crit:
-                                self._send(
-                                    to_id=bx.owner.unique_id,
-                                    performative=self.REQUEST,
-                                    content=[self.CRITICALITY_STRING, ant_reach_crit, self.criticality]
-                                )
-                    else:  # I'm carrying a box
-                        my_carried_box_crit = self._compute_anticipated_criticality(self.carried_box)
-                        if ant_reach_crit < my_carried_box_crit:
-                            self._send(
-                                to_id=bx.owner.unique_id,
-                                performative=self.REQUEST,
-                                content=[self.CRITICALITY_STRING, ant_reach_crit, self.criticality]
-                            )
+                if better_than_focus:   # first free box with the lowest criticality so far
+                    best_free_box = bx
+                    focus_crit = ant_reach_crit
+            elif bx.owner != self and better_than_focus:   # box has an owner, ask for it
+                self._send(
+                    to_id=bx.owner.unique_id,
+                    performative=self.REQUEST,
+                    content=[self.CRITICALITY_STRING, ant_reach_crit, self.criticality]
+                )
+
+        if best_free_box is None:
+            return
+        if self.carried_box is not None:  # drop the current box
+            self.carried_box.owner = None
+            self.carried_box = None
+        elif self.targeted_box is not None:
+            self.targeted_box.owner = None
+        # target the new better box
+        self.targeted_box = best_free_box
+        self.targeted_box.owner = self
 
     def read_requests(self):
         if not self.requests or self.battery <= self.min_battery:
             return
+        log = self.model.event_log
         for request in self.requests:
-            print(f"  Agent {self.unique_id} processing request from {request.sender}: {request.content}")
+            if log.debug:
+                log.emit(log.DEBUG, "read_request", self, sender=request.sender, request=request.content[0])
             request_type = request.content[0]
             if request_type==self.CRITICALITY_STRING and (self.carried_box or self.targeted_box):
                 # Safe to assume there's a real box to act on
@@ -112,7 +97,8 @@ class RobotCooperative(RobotBase):
                         self._send(to_id=request.sender, performative=self.INFORM, content=[self.GIVE_MY_BOX_STRING, my_ant_crit])
                         self.box_reserved = True
                 elif self.criticality + 10 <= sender_instant_crit:
-                    print("Sending box because you're much more critical")
+                    if log.debug:  # sending box because the sender is much more critical
+                        log.emit(log.DEBUG, "give_box", self, to=request.sender)
                     self._send(to_id=request.sender, performative=self.AGREE, content=[self.GIVE_MY_BOX_STRING])
                     self._send(to_id=request.sender, performative=self.INFORM, content=[self.GIVE_MY_BOX_STRING, my_ant_crit])
                     self.box_reserved = True
@@ -144,7 +130,11 @@ class RobotCooperative(RobotBase):
                 self.is_request_criticality_last_cycle = False
             else:
                 box_given = agree.content[0]
-                print(box_given)
+                if box_given.cell is None:  # delivered by someone else before this agree was read
+                    continue
+                log = self.model.event_log
+                if log.debug:
+                    log.emit(log.DEBUG, "box_given", self, sender=agree.sender, box=box_given.unique_id)
                 if self.carried_box:
                     self.carried_box.owner = None
                     self.carried_box = None
@@ -186,8 +176,9 @@ class RobotCooperative(RobotBase):
                 content_type = inform.content[0]
                 other_giver = inform.sender
                 if content_type==self.GIVE_MY_BOX_STRING and giver != other_giver:
-                    other_giver_agent = next(a for a in self.model.agents if a.unique_id == inform.sender)
-                    other_giver_agent.box_reserved = False
+                    other_giver_agent = self.model.message_bus.get_agent(other_giver)
+                    if other_giver_agent is not None:
+                        other_giver_agent.box_reserved = False
 
 
         self.informs.clear()
@@ -202,13 +193,8 @@ class RobotCooperative(RobotBase):
 
     def _send(self, to_id, performative, content):
         # todo: no battery check in send?
-        """send a message to another agent"""
-        try:
-            recipient = next(a for a in self.model.agents if a.unique_id==to_id)
-            msg = Message(self.unique_id, performative, content)
-            # add to a specific list based on performative
-            target_list = getattr(recipient, f"{performative}s")
-            target_list.append(msg)
-            print(f"✓ {performative} sent: {self.unique_id} → {to_id}")
-        except StopIteration:
-            print(f"✗ Agent {to_id} not found!")
\ No newline at end of file
+        """send a message to another agent, delivered at the end of the model step"""
+        self.model.message_bus.send(self.unique_id, to_id, performative, content)
+        log = self.model.event_log
+        if log.debug:
+            log.emit(log.DEBUG, "send", self, to=to_id, performative=performative, content=content[0])
\ No newline at end of file
@@ -1,8 +1,12 @@
+import numpy as np
+
 from .robot_base import RobotBase
 
 
 #  ===== ROBOT GREEDY =====
 class RobotGreedy(RobotBase):
+    __slots__ = ()
+
     def __init__(self, model, color, cell, vision_range=3):
         super().__init__(model, color, cell, vision_range)
 
@@ -11,33 +15,38 @@ class RobotGreedy(RobotBase):
         if not self.reachable_boxes or self.battery <= self.min_battery:
             return
 
-        for bx in self.reachable_boxes:
-            # skip if box is already owned by someone else
-            if bx.owner and bx.owner != self:
-                continue
+        # skip boxes already owned by someone else
+        candidates = [bx for bx in self.reachable_boxes if not bx.owner or bx.owner == self]
+        if not candidates:
+            return
+
+        # lowest anticipated criticality wins, first one on ties
+        criticalities = self._compute_anticipated_criticalities(candidates)
+        best_index = int(np.argmin(criticalities))
+        bx = candidates[best_index]
+        ant_reach_crit = criticalities[best_index]
 
-            ant_reach_crit = self._compute_anticipated_criticality(bx)
-            # not carrying anything
-            if self.carried_box is None:
-                if self.targeted_box is None:  # neither carrying nor targetting
-                    self.targeted_box = bx
-                    self.targeted_box.owner = self
-                else:  # not carrying but targeting
-                    my_target_box_crit = self._compute_anticipated_criticality(self.targeted_box)
-                    # check if this is a better box (lower criticality = better)
-                    if ant_reach_crit < my_target_box_crit:
-                        self.targeted_box.owner = None
-                        self.targeted_box = bx
-                        self.targeted_box.owner = self
-            # carrying a box
-            else:
-                my_carried_box_crit = self._compute_anticipated_criticality(self.carried_box)
-                # check if this is a better box
-                if ant_reach_crit < my_carried_box_crit:
-                    # drop the current box (on spot, not at nest)
-                    self.carried_box.owner = None
-                    self.carried_box = None
-                    # Target the new better box
+        # not carrying anything
+        if self.carried_box is None:
+            if self.targeted_box is None:  # neither carrying nor targetting
+                self.targeted_box = bx
+                self.targeted_box.owner = self
+            else:  # not carrying but targeting
+                my_target_box_crit = self._compute_anticipated_criticality(self.targeted_box)
+                # check if this is a better box (lower criticality = better)
+                if ant_reach_crit < my_target_box_crit:
+                    self.targeted_box.owner = None
                     self.targeted_box = bx
                     self.targeted_box.owner = self
+        # carrying a box
+        else:
+            my_carried_box_crit = self._compute_anticipated_criticality(self.carried_box)
+            # check if this is a better box
+            if ant_reach_crit < my_carried_box_crit:
+                # drop the current box (on spot, not at nest)
+                self.carried_box.owner = None
+                self.carried_box = None
+                # Target the new better box
+                self.targeted_box = bx
+                self.targeted_box.owner = self
 
@@ -3,6 +3,8 @@ from .robot_base import RobotBase
 
 
 class RobotRandom(RobotBase):
+    __slots__ = ()
+
     def __init__(self, model, color, cell, vision_range=3):
         super().__init__(model, color, cell, vision_range)
 
@@ -12,4 +14,6 @@ class RobotRandom(RobotBase):
             if available_boxes:
                 self.targeted_box = self.random.choice(available_boxes)
                 self.targeted_box.owner = self  # Reserve it immediately
-                print(f'targeted box {self.targeted_box.unique_id}')
\ No newline at end of file
+                log = self.model.event_log
+                if log.debug:
+                    log.emit(log.DEBUG, "target_box", self, box=self.targeted_box.unique_id)
\ No newline at end of file
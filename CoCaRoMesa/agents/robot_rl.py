@@ -0,0 +1,32 @@
+from .robot_base import RobotBase
+
+
+#  ===== ROBOT RL =====
+class RobotRL(RobotBase):
+    """Q-learning robot (port of robot_rl.gaml)
+
+    Box selection and switching for every RL robot are done in one batch by
+    model.q_learning at the start of each model step, so the robot's own step
+    only moves, takes, carries and drops boxes.
+    """
+    __slots__ = ("rl_index",)
+
+    def __init__(self, model, color, cell, vision_range=3):
+        super().__init__(model, color, cell, vision_range)
+        # row of this robot in the learner's arrays
+        self.rl_index = self.model.q_learning.register(self)
+
+    def update_reachable_boxes(self):
+        pass  # refreshed by the Q-learning batch
+
+    def search_box(self):
+        pass  # decided by the Q-learning batch
+
+    def wander(self):
+        """Wander, or take the step a move action queued for this robot"""
+        cell = self.model.q_learning.pending_moves.pop(self, None)
+        if cell is None:
+            super().wander()
+        elif self.battery > self.min_battery:
+            self.previous_cell = self.cell
+            self.cell = cell
@@ -1,6 +1,38 @@
 from .robot_base import RobotBase
+from .robot_cooperative import RobotCooperative
 
 
 #  ===== ROBOT Saphesia =====
-class RobotSaphesia(RobotBase):
-    pass
\ No newline at end of file
+class RobotSaphesia(RobotCooperative):
+    """Cooperative robot belonging to the component system of its color (port of robot_saphesia.gaml)
+
+    Besides boxes of its own color, the robot gets the full reward for boxes
+    of the colors its system helps.
+    """
+    __slots__ = ("system",)
+
+    def __init__(self, model, color, cell, vision_range=3):
+        super().__init__(model, color, cell, vision_range)
+        self.system = self.model.component_systems.add_robot(color, self._battery)
+
+    @property
+    def battery(self):
+        return self._battery
+
+    @battery.setter
+    def battery(self, value):
+        """Set the battery, keeping the system's alive and dying counts up to date"""
+        old_battery = self._battery
+        RobotBase.battery.fset(self, value)
+        self.system.battery_changed(old_battery, self._battery)
+
+    def _colors_reward_efficiency(self, box_color):
+        if box_color in self.system.helped_colors:
+            return self.reward
+        return super()._colors_reward_efficiency(box_color)
+
+    def _full_reward(self, box_colors):
+        full_reward = self.system.full_reward[box_colors]
+        if self.color != self.system.color:  # dead robots are gray, only the helped colors pay in full
+            full_reward &= box_colors != self.model.color_index[self.system.color]
+        return full_reward
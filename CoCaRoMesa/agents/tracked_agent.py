@@ -0,0 +1,27 @@
+from mesa.discrete_space import CellAgent
+
+#   ===== TRACKED CELL AGENT =====
+class TrackedCellAgent(CellAgent):
+    """CellAgent that reports every cell change to the model's free-cell index
+
+    mesa.Agent declares no __slots__, so every agent still has an instance
+    __dict__. The attributes Mesa sets on every agent are slotted here, and
+    subclasses slot their own: they are stored in fixed fields of the object
+    instead of that __dict__, which stays empty.
+    """
+    __slots__ = ("model", "unique_id", "pos", "_mesa_cell")
+
+    def __init__(self, model, *args, **kwargs):
+        self._mesa_cell = None  # the slot hides HasCell's class-level default
+        super().__init__(model, *args, **kwargs)
+
+    @property
+    def cell(self):
+        return self._mesa_cell
+
+    @cell.setter
+    def cell(self, cell):
+        old_cell = self._mesa_cell
+        CellAgent.cell.fset(self, cell)
+        if old_cell is not cell:
+            self.model.free_cells.move(old_cell, cell)
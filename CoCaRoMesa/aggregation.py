@@ -0,0 +1,231 @@
+"""Single-pass aggregation of per-run time series over replicates.
+
+Runs are fed one at a time; per (robot_type, step) the aggregator keeps a
+running count, mean and variance (Welford) and P² quantile markers (Jain &
+Chlamtac), so memory depends on the number of steps and robot types, never on
+the number of replicates.
+"""
+import numpy as np
+
+
+def _grow(array, size, fill=0):
+    """Return array extended along axis 0 to at least size rows"""
+    if len(array) >= size:
+        return array
+    extra = np.full((size - len(array),) + array.shape[1:], fill, dtype=array.dtype)
+    return np.concatenate([array, extra])
+
+
+def _check_unique(steps):
+    """Raise ValueError when a step repeats: fancy-indexed updates would keep only one of its values"""
+    if len(steps) > 1 and not (np.diff(steps) > 0).all() and len(np.unique(steps)) != len(steps):
+        raise ValueError("a run must observe each step at most once (two runs stored under one run id?)")
+
+
+#  ===== P² QUANTILE =====
+class P2Quantile:
+    """P² estimate of one quantile, for many independent positions at once"""
+
+    def __init__(self, p):
+        self.p = p
+        self.count = np.zeros(0, dtype=np.int64)
+        self.heights = np.zeros((0, 5))
+        self.positions = np.zeros((0, 5))
+        self.desired = np.zeros((0, 5))
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def update(self, index, values):
+        """Add one observation values[i] at position index[i] (indices must be unique)"""
+        size = int(index.max()) + 1 if len(index) else 0
+        self.count = _grow(self.count, size)
+        self.heights = _grow(self.heights, size)
+        self.positions = _grow(self.positions, size)
+        self.desired = _grow(self.desired, size)
+        values = np.asarray(values, dtype=np.float64)
+
+        # first five observations of a position are kept as they come
+        filling = self.count[index] < 5
+        fill_index = index[filling]
+        self.heights[fill_index, self.count[fill_index]] = values[filling]
+        self.count[fill_index] += 1
+        ready = fill_index[self.count[fill_index] == 5]
+        if len(ready):
+            self.heights[ready] = np.sort(self.heights[ready], axis=1)
+            self.positions[ready] = np.arange(1, 6)
+            self.desired[ready] = 1 + 4 * self.increments
+
+        update_index = index[~filling]
+        if len(update_index):
+            self._update_markers(update_index, values[~filling])
+            self.count[update_index] += 1
+
+    def _update_markers(self, index, x):
+        q = self.heights[index]
+        n = self.positions[index]
+        rows = np.arange(len(index))
+
+        # cell k with q[k] <= x < q[k+1], extremes replace the end markers
+        q[:, 0] = np.minimum(q[:, 0], x)
+        q[:, 4] = np.maximum(q[:, 4], x)
+        k = (x[:, None] >= q[:, 1:4]).sum(axis=1)
+        n += np.arange(5) > k[:, None]
+        desired = self.desired[index] + self.increments
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i in (1, 2, 3):
+                offset = desired[:, i] - n[:, i]
+                up = (offset >= 1) & (n[:, i + 1] - n[:, i] > 1)
+                down = (offset <= -1) & (n[:, i - 1] - n[:, i] < -1)
+                move = up | down
+                if not move.any():
+                    continue
+                s = np.where(up, 1.0, -1.0)
+                parabolic = q[:, i] + s / (n[:, i + 1] - n[:, i - 1]) * (
+                    (n[:, i] - n[:, i - 1] + s) * (q[:, i + 1] - q[:, i]) / (n[:, i + 1] - n[:, i])
+                    + (n[:, i + 1] - n[:, i] - s) * (q[:, i] - q[:, i - 1]) / (n[:, i] - n[:, i - 1])
+                )
+                neighbor = i + s.astype(np.int64)
+                linear = q[:, i] + s * (q[rows, neighbor] - q[:, i]) / (n[rows, neighbor] - n[:, i])
+                inside = (q[:, i - 1] < parabolic) & (parabolic < q[:, i + 1])
+                q[move, i] = np.where(inside, parabolic, linear)[move]
+                n[move, i] += s[move]
+
+        self.heights[index] = q
+        self.positions[index] = n
+        self.desired[index] = desired
+
+    def estimate(self):
+        """Quantile estimate per position, exact while a position has fewer than 5 observations"""
+        result = self.heights[:, 2].copy()
+        for position in np.flatnonzero(self.count < 5):
+            seen = self.heights[position, :self.count[position]]
+            result[position] = np.quantile(seen, self.p) if len(seen) else np.nan
+        return result
+
+
+#  ===== RUNNING STATISTICS =====
+class RunningStats:
+    """Per-step count, mean, variance and quantiles of one metric over runs"""
+
+    def __init__(self, quantiles=(0.05, 0.5, 0.95)):
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.quantiles = {p: P2Quantile(p) for p in quantiles}
+
+    def update(self, steps, values):
+        """Add one run: values[i] observed at step steps[i], each step at most once"""
+        steps = np.asarray(steps, dtype=np.int64)
+        _check_unique(steps)
+        values = np.asarray(values, dtype=np.float64)
+        size = int(steps.max()) + 1 if len(steps) else 0
+        self.count = _grow(self.count, size)
+        self.mean = _grow(self.mean, size)
+        self.m2 = _grow(self.m2, size)
+
+        # Welford update, vectorized over the steps of the run
+        self.count[steps] += 1
+        delta = values - self.mean[steps]
+        self.mean[steps] += delta / self.count[steps]
+        self.m2[steps] += delta * (values - self.mean[steps])
+        for estimator in self.quantiles.values():
+            estimator.update(steps, values)
+
+    @property
+    def steps(self):
+        """Steps observed in at least one run"""
+        return np.flatnonzero(self.count)
+
+    @property
+    def variance(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    def ci_halfwidth(self, z=1.96):
+        """Half width of the normal-approximation confidence interval of the mean"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return z * np.sqrt(self.variance / self.count)
+
+    def quantile(self, p):
+        return self.quantiles[p].estimate()
+
+
+#  ===== REPLICATE AGGREGATOR =====
+class ReplicateAggregator:
+    """Running per-(robot_type, step) statistics and per-run summaries"""
+
+    def __init__(self, metrics, step_column="step", quantiles=(0.05, 0.5, 0.95)):
+        self.metrics = list(metrics)
+        self.step_column = step_column
+        self.quantiles = quantiles
+        self.stats = {}         # robot_type -> {metric: RunningStats}
+        self.summaries = {}     # robot_type -> {summary: RunningStats over runs, at position 0}
+        self.censored = {}      # robot_type -> runs whose robots never all died
+        self.run_count = {}
+
+    def add_run(self, robot_type, columns):
+        """Fold one run ({column: array}) into the aggregates"""
+        steps = np.asarray(columns[self.step_column])
+        _check_unique(steps)  # before anything is counted
+        if robot_type not in self.stats:
+            self.stats[robot_type] = {metric: RunningStats(self.quantiles) for metric in self.metrics}
+            self.summaries[robot_type] = {
+                "time_to_extinction": RunningStats(self.quantiles),
+                "final_box_backlog": RunningStats(self.quantiles),
+            }
+            self.censored[robot_type] = 0
+            self.run_count[robot_type] = 0
+        self.run_count[robot_type] += 1
+
+        for metric, running in self.stats[robot_type].items():
+            running.update(steps, columns[metric])
+
+        summaries = self.summaries[robot_type]
+        if len(steps):
+            summaries["final_box_backlog"].update([0], [columns["box_count"][-1]])
+            extinct = np.flatnonzero(np.asarray(columns["alive_robots"]) == 0)
+            if len(extinct):
+                summaries["time_to_extinction"].update([0], [steps[extinct[0]]])
+            else:
+                self.censored[robot_type] += 1
+
+    def summary_table(self):
+        """One row per robot type: mean, CI and quantiles of the per-run summaries"""
+        import pandas as pd
+
+        rows = []
+        for robot_type, summaries in self.summaries.items():
+            row = {"robot_type": robot_type, "runs": self.run_count[robot_type],
+                   "never_extinct": self.censored[robot_type]}
+            for name, running in summaries.items():
+                if not len(running.count) or running.count[0] == 0:
+                    continue
+                row[f"{name}_mean"] = running.mean[0]
+                row[f"{name}_ci"] = running.ci_halfwidth()[0]
+                for p in self.quantiles:
+                    row[f"{name}_q{int(p * 100)}"] = running.quantile(p)[0]
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def plot_bands(aggregator, metrics, colors=None, xlabel="Step"):
+    """One axis per (metric, label) in metrics: mean line and CI band per robot type"""
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(len(metrics), 1, figsize=(10, 4 * len(metrics)), sharex=True, squeeze=False)
+    axes = axes[:, 0]
+    for robot_type, stats in aggregator.stats.items():
+        color = (colors or {}).get(robot_type)
+        for ax, (metric, _) in zip(axes, metrics):
+            running = stats[metric]
+            steps = running.steps
+            mean = running.mean[steps]
+            halfwidth = np.nan_to_num(running.ci_halfwidth()[steps])
+            ax.plot(steps, mean, color=color, label=f"{robot_type} (n={aggregator.run_count[robot_type]})")
+            ax.fill_between(steps, mean - halfwidth, mean + halfwidth, color=color, alpha=0.25)
+    for ax, (_, label) in zip(axes, metrics):
+        ax.set_ylabel(label)
+        ax.legend()
+    axes[-1].set_xlabel(xlabel)
+    fig.tight_layout()
+    return fig
@@ -1 +1,43 @@
-#  could contain any analysis code.
\ No newline at end of file
+"""Aggregate sweep results from a ResultStore (see batch_run.py) over replicates.
+
+Runs are streamed from the store one at a time, so memory stays flat however
+many replicates the sweep has.
+
+Example:
+    python analysis.py sweep_results --robot-types GREEDY COOPERATIVE
+"""
+import argparse
+
+import matplotlib.pyplot as plt
+
+from aggregation import ReplicateAggregator, plot_bands
+from result_store import ResultStore
+
+
+METRICS = [
+    ("mean_battery", "Mean Battery Level"),
+    ("box_count", "Boxes in Environment"),
+    ("alive_robots", "Alive Robots in Environment"),
+]
+COLORS = {"RANDOM": "gray", "GREEDY": "green", "COOPERATIVE": "blue", "SAPHESIA": "black", "RL": "red"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate CoCaRoModel sweep results over replicates")
+    parser.add_argument("store", help="ResultStore directory")
+    parser.add_argument("--robot-types", nargs="+", default=None, help="robot types to include (default: all)")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store)
+    aggregator = ReplicateAggregator([metric for metric, _ in METRICS])
+    # one run at a time, only the aggregated columns are read from disk
+    for robot_type, run_id, columns in store.iter_runs(["step"] + aggregator.metrics, args.robot_types):
+        aggregator.add_run(robot_type, columns)
+
+    print(aggregator.summary_table().to_string(index=False))
+    plot_bands(aggregator, METRICS, COLORS)
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
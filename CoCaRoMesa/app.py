@@ -1,7 +1,10 @@
+import weakref
+
 from mesa.visualization import make_space_component, SolaraViz
 from mesa.visualization.utils import update_counter
 from matplotlib.figure import Figure
-import seaborn as sns
+import numpy as np
+import pandas as pd
 import solara
 
 
@@ -10,6 +13,7 @@ from agents.box import Box
 from agents.robot_base import RobotBase
 from model import CoCaRoModel
 from agents.nest import Nest
+from raster import raster
 
 
 model_params = {
@@ -20,87 +24,132 @@ model_params = {
     "box_num": 18
 }
 
+# model steps between two redraws
+RENDER_INTERVAL = 10
+# side of the space figure, in inches
+SPACE_FIGURE_SIZE = 10
+# grids with more cells are drawn as one image (see raster.py) instead of one marker per agent
+RASTER_MIN_CELLS = 100 * 100
+# raster images wider or higher than that are downsampled, None to keep one pixel per cell
+RASTER_MAX_PIXELS = 250
 
-@solara.component
-def BoxCountPlot(model):
-    update_counter.get()  # ensures re-rendering on step
 
-    # Retrieve collected data
-    df = model.data_collector.get_model_vars_dataframe().reset_index()
+#  ===== COLLECTED DATA =====
+class ReporterHistory:
+    """The model reporters collected so far, as NumPy columns grown in place
 
-    fig = Figure(figsize=(6, 4))
-    ax = fig.subplots()
+    Each update copies only the rows collected since the previous one into
+    the columns, then builds the DataFrame the plots share until new rows
+    come in.
+    """
 
-    # Plot using seaborn (with matplotlib backend)
-    sns.lineplot(data=df, x="index", y="BoxCount", ax=ax)
+    def __init__(self, model):
+        self.model_vars = model.data_collector.model_vars
+        self.columns = list(self.model_vars)
+        self._buffers = {column: np.empty(64) for column in self.columns}
+        self.length = 0
+        self.frame = pd.DataFrame({column: [] for column in self.columns})
 
-    ax.set_title("Box Count Over Time")
-    ax.set_xlabel("Step")
-    ax.set_ylabel("Box Count")
-    ax.grid(True, linestyle='--', linewidth=0.5)
+    def update(self):
+        # only take the rows every reporter has collected
+        length = min(len(self.model_vars[column]) for column in self.columns)
+        if length == self.length:
+            return self.frame
+        for column in self.columns:
+            buffer = self._buffers[column]
+            if length > len(buffer):  # double the capacity
+                buffer = np.resize(buffer, max(length, 2 * len(buffer)))
+                self._buffers[column] = buffer
+            buffer[self.length:length] = self.model_vars[column][self.length:length]
+        self.length = length
+        self.frame = pd.DataFrame({column: self._buffers[column][:length] for column in self.columns})
+        return self.frame
 
-    solara.FigureMatplotlib(fig)
 
-@solara.component
-def MeanBatteryPlot(model):
-    update_counter.get()  # ensures re-rendering on step
+_histories = weakref.WeakKeyDictionary()
 
-    # Retrieve collected data
-    df = model.data_collector.get_model_vars_dataframe().reset_index()
 
-    fig = Figure(figsize=(6, 4))
-    ax = fig.subplots()
+def model_history(model):
+    """DataFrame of the reporters collected so far, built once per tick and shared by every plot"""
+    history = _histories.get(model)
+    if history is None:
+        history = _histories[model] = ReporterHistory(model)
+    return history.update()
 
-    # Plot using seaborn (with matplotlib backend)
-    sns.lineplot(data=df, x="index", y="MeanBatteryLevel", ax=ax)
 
-    ax.set_title("Mean Battery Level Over Time")
-    ax.set_xlabel("Step")
-    ax.set_ylabel("Mean Battery")
-    ax.grid(True, linestyle='--', linewidth=0.5)
+#  ===== PLOTS =====
+def make_line_plot(column, title, ylabel):
+    """Component plotting one reporter over time on a figure kept across steps
 
-    solara.FigureMatplotlib(fig)
+    Every step only moves the line's data and rescales the axes; the
+    figure is rebuilt when the model is reset.
+    """
 
+    def create_figure():
+        fig = Figure(figsize=(6, 4))
+        ax = fig.subplots()
+        line, = ax.plot([], [])
+        ax.set_title(title)
+        ax.set_xlabel("Step")
+        ax.set_ylabel(ylabel)
+        ax.grid(True, linestyle='--', linewidth=0.5)
+        return fig, line
 
-@solara.component
-def AliveRobotsPlot(model):
-    update_counter.get()  # ensures re-rendering on step
+    @solara.component
+    def LinePlot(model):
+        update_counter.get()  # ensures re-rendering on step
 
-    # Retrieve collected data
-    df = model.data_collector.get_model_vars_dataframe().reset_index()
+        fig, line = solara.use_memo(create_figure, dependencies=[model])
+        df = model_history(model)
+        line.set_data(df["Step"].to_numpy(), df[column].to_numpy())
+        line.axes.relim()
+        line.axes.autoscale_view()
 
-    fig = Figure(figsize=(6, 4))
-    ax = fig.subplots()
+        solara.FigureMatplotlib(fig, dependencies=[model, update_counter.value])
 
-    # Plot using seaborn (with matplotlib backend)
-    sns.lineplot(data=df, x="index", y="AliveRobots", ax=ax)
+    LinePlot.__name__ = f"{column}Plot"
+    return LinePlot
 
-    ax.set_title("Alive Robots Over Time")
-    ax.set_xlabel("Step")
-    ax.set_ylabel("Alive Robots")
-    ax.grid(True, linestyle='--', linewidth=0.5)
-    solara.FigureMatplotlib(fig)
 
+BoxCountPlot = make_line_plot("BoxCount", "Box Count Over Time", "Box Count")
+MeanBatteryPlot = make_line_plot("MeanBatteryLevel", "Mean Battery Level Over Time", "Mean Battery")
+AliveRobotsPlot = make_line_plot("AliveRobots", "Alive Robots Over Time", "Alive Robots")
 
 
-def agent_portrayal(agent):
-    if agent is None:
-        return
 
+#  ===== SPACE =====
+# marker size (points^2) giving the same proportions as 200 on the former 20x20 inch figure
+MARKER_SIZE = 200 * (SPACE_FIGURE_SIZE / 20) ** 2
+
+# (agent class, color) -> portrayal, Mesa copies the dict it gets
+_portrayals = {}
+
+
+def _portrayal(agent_class, color):
     portrayal = {
-        "size": 200,
-        "color": "tab:"+agent.color,
+        "size": MARKER_SIZE,
+        "color": "tab:"+color,
     }
-    if isinstance(agent, Box):
+    if issubclass(agent_class, Box):
         portrayal["marker"] = "s"   # square for boxes
         portrayal["zorder"] = 1
-    elif isinstance(agent, Nest):
+    elif issubclass(agent_class, Nest):
         portrayal["marker"] = "H"   # hexagon for trash bins
         portrayal["zorder"] = 0     # background layer
-    elif isinstance(agent, RobotBase):
+    elif issubclass(agent_class, RobotBase):
         portrayal["marker"] = "^"   # triangle pointing up for robots
         portrayal["zorder"] = 2     # top layer
+    return portrayal
+
 
+def agent_portrayal(agent):
+    if agent is None:
+        return
+
+    key = (type(agent), agent.color)
+    portrayal = _portrayals.get(key)
+    if portrayal is None:
+        portrayal = _portrayals[key] = _portrayal(*key)
     return portrayal
 
 
@@ -108,7 +157,36 @@ def agent_portrayal(agent):
 
 def grow_figure(ax):
     # ax is your grid’s Axes; get the Figure and resize it
-    ax.figure.set_size_inches(20, 20)
+    ax.figure.set_size_inches(SPACE_FIGURE_SIZE, SPACE_FIGURE_SIZE)
+
+def make_raster_component(max_pixels=RASTER_MAX_PIXELS):
+    """Space component drawing the grid as one image from raster.raster, for large grids
+
+    The figure and its image artist are kept across steps, only the pixels
+    change.
+    """
+
+    def create_figure(model):
+        fig = Figure(figsize=(SPACE_FIGURE_SIZE, SPACE_FIGURE_SIZE))
+        ax = fig.subplots()
+        width, height = model.grid.dimensions
+        image = ax.imshow(raster(model, max_pixels), extent=(-0.5, width - 0.5, -0.5, height - 0.5),
+                          interpolation="nearest")
+        ax.set_xticks([])
+        ax.set_yticks([])
+        return fig, image
+
+    @solara.component
+    def RasterSpace(model):
+        update_counter.get()  # ensures re-rendering on step
+
+        fig, image = solara.use_memo(lambda: create_figure(model), dependencies=[model])
+        image.set_data(raster(model, max_pixels))
+
+        solara.FigureMatplotlib(fig, format="png", bbox_inches="tight",
+                                dependencies=[model, update_counter.value])
+
+    return RasterSpace
 
 # create the components
 def create_visualization():
@@ -119,16 +197,20 @@ def create_visualization():
         width=model_params["width"],
         height=model_params["height"]
     )
-    SpaceGraph = make_space_component(
-        agent_portrayal,
-        post_process=grow_figure
-    )
+    if model_params["width"] * model_params["height"] >= RASTER_MIN_CELLS:
+        SpaceGraph = make_raster_component()
+    else:
+        SpaceGraph = make_space_component(
+            agent_portrayal,
+            post_process=grow_figure
+        )
 
     return SolaraViz(
         model=cocaro_model,
         components=[SpaceGraph, BoxCountPlot, MeanBatteryPlot, AliveRobotsPlot],
         model_params=model_params,
         name="CoCaRo Model",
+        render_interval=RENDER_INTERVAL,
     )
 
 app = create_visualization()
@@ -136,4 +218,4 @@ Page = app
 
 if __name__ == "__main__":
     print("Run with: solara run app.py")
-    print("Or: python -m solara.server app.py")
\ No newline at end of file
+    print("Or: python -m solara.server app.py")
@@ -0,0 +1,464 @@
+"""Struct-of-arrays CoCaRoModel for very large RANDOM and GREEDY populations.
+
+Robot and box state lives in flat NumPy arrays instead of agents, and every
+robot phase of RobotBase.step (update_battery -> wander -> search_box ->
+update_carried_box_position -> go_to_target_box -> take_box ->
+carry_box_to_nest -> drop_box_in_nest -> die) runs as one vectorized pass over
+all robots. The rules are those of RobotRandom and RobotGreedy; what changes is
+that robots act phase by phase instead of one after the other. When several
+robots want the same free box in the same step, a random one gets it and the
+others choose again among the boxes still free, which is what the sequential
+shuffle_do order amounts to.
+
+Nests sit at the same relative positions as in CoCaRoModel (which are the
+hard-coded cells on a 50x50 grid), so larger grids keep the same layout.
+"""
+import mesa
+import numpy as np
+from mesa.datacollection import DataCollector
+
+from agents.robot_base import RobotBase
+from event_log import EventLog
+from model import CoCaRoModel
+
+
+# von Neumann moves of OrthogonalVonNeumannGrid
+MOVES = np.array([(0, -1), (0, 1), (-1, 0), (1, 0)], dtype=np.int64)
+
+
+def vision_offsets(radius):
+    """Offsets within Manhattan radius, the center excluded, nearest rings first"""
+    offsets = [(dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+               if 0 < abs(dx) + abs(dy) <= radius]
+    offsets.sort(key=lambda offset: abs(offset[0]) + abs(offset[1]))
+    return np.array(offsets, dtype=np.int64)
+
+
+class ArrayCoCaRoModel(mesa.Model):
+    ROBOT_TYPES = ("RANDOM", "GREEDY")
+    # RobotBase constants, integer rewards since batteries are integers anyway
+    VISION_RANGE = 3
+    MAX_BATTERY = RobotBase.max_battery
+    MIN_BATTERY = RobotBase.min_battery
+    BATTERY_CONSUM = RobotBase.battery_consum
+    REWARD = int(RobotBase.reward)
+    REDUCED_REWARD = int(RobotBase.reduced_reward)
+    MAX_CRITICALITY = RobotBase.max_criticality
+    # nest cells as fractions of the grid size, shared with the agent model
+    NEST_LOCATIONS = CoCaRoModel.nest_locations
+
+    def __init__(self, robot_type, robot_num, box_num, width=50, height=50, seed=None, collect_interval=1,
+                 log_level="off", log_path=None, box_spawn_interval=3, boxes_per_spawn=1, box_spawn_rate=None,
+                 box_hotspots=None, hotspot_radius=3):
+        if robot_type not in self.ROBOT_TYPES:
+            raise ValueError(f"array engine supports {', '.join(self.ROBOT_TYPES)}, not {robot_type!r}")
+        super().__init__(seed=seed)
+        self.event_log = EventLog(self, level=log_level, path=log_path)
+        self.width = width
+        self.height = height
+        self.robot_type = robot_type
+        self.robot_num = robot_num
+        self.box_num = box_num
+        self.box_spawn_interval = box_spawn_interval
+        self.boxes_per_spawn = boxes_per_spawn
+        self.box_spawn_rate = box_spawn_rate
+        self.box_hotspots = [tuple(hotspot) for hotspot in box_hotspots] if box_hotspots else []
+        self.hotspot_radius = hotspot_radius
+        self.colors = ["red", "green", "blue"]
+        self.collect_interval = collect_interval
+        self.offsets = vision_offsets(self.VISION_RANGE)
+
+        self.initialize_nests()
+        self.initialize_boxes()
+        self.initialize_robots()
+
+        self.data_collector = DataCollector(
+            model_reporters={
+                "Step": lambda m: m.steps,
+                "BoxCount": lambda m: m.box_count,
+                "MeanBatteryLevel": lambda m: m.mean_battery,
+                "AliveRobots": lambda m: m.alive_robot_count,
+                "Messages": lambda m: 0,
+            }
+        )
+
+    # ----- setup -----
+    def initialize_nests(self):
+        # nest_x[c], nest_y[c]: nest of color index c
+        shuffled_colors = self.random.sample(range(len(self.colors)), len(self.colors))
+        self.nest_x = np.zeros(len(self.colors), dtype=np.int64)
+        self.nest_y = np.zeros(len(self.colors), dtype=np.int64)
+        for color, (fx, fy) in zip(shuffled_colors, self.NEST_LOCATIONS):
+            self.nest_x[color] = int(fx * self.width)
+            self.nest_y[color] = int(fy * self.height)
+
+    def initialize_boxes(self):
+        self.box_x = np.zeros(0, dtype=np.int64)
+        self.box_y = np.zeros(0, dtype=np.int64)
+        self.box_color = np.zeros(0, dtype=np.int64)
+        self.box_owner = np.zeros(0, dtype=np.int64)   # robot index, -1 for none
+        self.box_alive = np.zeros(0, dtype=bool)
+        self.box_total = 0  # slots used, removed boxes are never reused
+        self.box_count = 0
+        self._add_boxes(
+            self.rng.integers(0, self.width, self.box_num),
+            self.rng.integers(0, self.height, self.box_num),
+            self.rng.integers(0, len(self.colors), self.box_num),
+        )
+
+    def initialize_robots(self):
+        n = self.robot_num
+        robots_per_color = n // len(self.colors)
+        color = np.repeat(np.arange(len(self.colors)), robots_per_color)
+        remaining = n - len(color)
+        self.color = np.concatenate([color, self.rng.integers(0, len(self.colors), remaining)])  # -1 once dead
+        self.x = self.rng.integers(0, self.width, n)
+        self.y = self.rng.integers(0, self.height, n)
+        # no previous cell yet: the first step counts as a move, like RobotBase
+        self.prev_x = np.full(n, -1, dtype=np.int64)
+        self.prev_y = np.full(n, -1, dtype=np.int64)
+        self.battery = np.full(n, self.MAX_BATTERY, dtype=np.int64)
+        self.criticality = np.zeros(n, dtype=np.int64)
+        self.target = np.full(n, -1, dtype=np.int64)        # targeted box index
+        self.carry = np.full(n, -1, dtype=np.int64)         # carried box index
+        self.target_nest = np.full(n, -1, dtype=np.int64)   # nest color index
+
+    def _add_boxes(self, xs, ys, colors):
+        count = len(xs)
+        start = self.box_total
+        if start + count > len(self.box_x):
+            capacity = max(2 * len(self.box_x), start + count, 16)
+            self.box_x = _resize(self.box_x, capacity, 0)
+            self.box_y = _resize(self.box_y, capacity, 0)
+            self.box_color = _resize(self.box_color, capacity, 0)
+            self.box_owner = _resize(self.box_owner, capacity, -1)
+            self.box_alive = _resize(self.box_alive, capacity, False)
+        self.box_x[start:start + count] = xs
+        self.box_y[start:start + count] = ys
+        self.box_color[start:start + count] = colors
+        self.box_owner[start:start + count] = -1
+        self.box_alive[start:start + count] = True
+        self.box_total += count
+        self.box_count += count
+
+    # ----- reporters -----
+    @property
+    def mean_battery(self):
+        return float(self.battery.mean()) if self.robot_num else 0
+
+    @property
+    def alive_robot_count(self):
+        return int(np.count_nonzero(self.battery > self.MIN_BATTERY))
+
+    # ----- step -----
+    def step(self):
+        if self.event_log.info:
+            self.event_log.emit(EventLog.INFO, "model_step", robots=self.robot_num, boxes=self.box_count)
+        alive = self._update_battery()
+        # vision is taken before wandering, as RobotBase.update_reachable_boxes
+        if self.robot_type == "GREEDY":
+            searching = np.flatnonzero(alive)
+        else:
+            searching = np.flatnonzero(alive & (self.target < 0) & (self.carry < 0))
+        pair_robots, pair_boxes = self._visible_boxes(searching)
+        self._wander(alive)
+        if self.robot_type == "GREEDY":
+            self._search_box_greedy(pair_robots, pair_boxes)
+        else:
+            self._search_box_random(pair_robots, pair_boxes)
+        self._update_carried_box_position(alive)
+        self._go_to_target_box(alive)
+        self._take_box(alive)
+        self._carry_box_to_nest(alive)
+        self._drop_box_in_nest(alive)
+        self._die()
+
+        self._spawn_boxes(self._boxes_due())
+
+        if self.steps % self.collect_interval == 0:
+            self.data_collector.collect(self)
+
+    def _update_battery(self):
+        """Spend BATTERY_CONSUM for robots that moved last step, return the alive mask"""
+        moved = (self.x != self.prev_x) | (self.y != self.prev_y)
+        spending = (self.battery > self.MIN_BATTERY) & moved
+        self.battery[spending] = np.maximum(self.battery[spending] - self.BATTERY_CONSUM, self.MIN_BATTERY)
+        self.criticality = self.MAX_CRITICALITY - self.battery
+        return self.battery > self.MIN_BATTERY
+
+    def _visible_boxes(self, robots):
+        """(robot, box) pairs with the box within VISION_RANGE of the robot, its own cell excluded
+
+        Live boxes are sorted by cell once, with a per-cell count and start
+        offset table, so every (robot, offset) cell is an O(1) lookup and cells
+        holding several boxes need no per-robot loop. Pairs come per robot,
+        nearest rings first.
+        """
+        live = np.flatnonzero(self.box_alive[:self.box_total])
+        if not len(live) or not len(robots):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        keys = self.box_x[live] * self.height + self.box_y[live]
+        sorted_boxes = live[np.argsort(keys, kind="stable")]
+        cell_counts = np.bincount(keys, minlength=self.width * self.height)
+        cell_starts = np.cumsum(cell_counts) - cell_counts
+
+        cell_x = (self.x[robots, None] + self.offsets[:, 0]).ravel()
+        cell_y = (self.y[robots, None] + self.offsets[:, 1]).ravel()
+        inside = (cell_x >= 0) & (cell_x < self.width) & (cell_y >= 0) & (cell_y < self.height)
+        cell_keys = np.where(inside, cell_x * self.height + cell_y, 0)
+        starts = cell_starts[cell_keys]
+        counts = np.where(inside, cell_counts[cell_keys], 0)
+
+        total = int(counts.sum())
+        pair_robots = np.repeat(np.repeat(robots, len(self.offsets)), counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        pair_boxes = sorted_boxes[np.repeat(starts, counts) + np.arange(total) - first]
+        return pair_robots, pair_boxes
+
+    def _wander(self, alive):
+        """Random neighbor other than the previous cell, for robots with no box or nest to head to"""
+        robots = np.flatnonzero(alive & (self.target < 0) & (self.target_nest < 0))
+        if not len(robots):
+            return
+        next_x = self.x[robots, None] + MOVES[:, 0]
+        next_y = self.y[robots, None] + MOVES[:, 1]
+        valid = (next_x >= 0) & (next_x < self.width) & (next_y >= 0) & (next_y < self.height)
+        forward = valid & ~((next_x == self.prev_x[robots, None]) & (next_y == self.prev_y[robots, None]))
+        # if no valid neighbors (trapped), then allow going back
+        allowed = np.where(forward.any(axis=1)[:, None], forward, valid)
+        choice = np.argmax(np.where(allowed, self.rng.random(allowed.shape), -1.0), axis=1)
+        rows = np.arange(len(robots))
+        self._move(robots, next_x[rows, choice], next_y[rows, choice])
+
+    def _move(self, robots, new_x, new_y):
+        self.prev_x[robots] = self.x[robots]
+        self.prev_y[robots] = self.y[robots]
+        self.x[robots] = new_x
+        self.y[robots] = new_y
+
+    def _move_towards_target(self, robots, target_x, target_y):
+        """One step along a random shortest direction, robots already on target stay put"""
+        moving = (self.x[robots] != target_x) | (self.y[robots] != target_y)
+        robots, target_x, target_y = robots[moving], target_x[moving], target_y[moving]
+        step_x = np.sign(target_x - self.x[robots])
+        step_y = np.sign(target_y - self.y[robots])
+        # both axes bring the robot closer: pick one at random
+        use_x = (step_x != 0) & ((step_y == 0) | (self.rng.random(len(robots)) < 0.5))
+        self._move(robots, self.x[robots] + np.where(use_x, step_x, 0),
+                   self.y[robots] + np.where(use_x, 0, step_y))
+
+    def _anticipated_criticality(self, robots, boxes):
+        """RobotBase._anticipated_criticalities for (robots[i], boxes[i]) pairs"""
+        box_x, box_y, box_color = self.box_x[boxes], self.box_y[boxes], self.box_color[boxes]
+        dist_box_to_me = np.abs(box_x - self.x[robots]) + np.abs(box_y - self.y[robots])
+        dist_box_to_nest = np.abs(box_x - self.nest_x[box_color]) + np.abs(box_y - self.nest_y[box_color])
+        return RobotBase.anticipated_criticality(self.battery[robots], dist_box_to_me, dist_box_to_nest,
+                                                 box_color == self.color[robots])
+
+    def _claim(self, robots, boxes):
+        """Mask of the claims that win: one random claimant per box"""
+        order = np.lexsort((self.rng.random(len(robots)), boxes))
+        _, first = np.unique(boxes[order], return_index=True)
+        won = np.zeros(len(robots), dtype=bool)
+        won[order[first]] = True
+        return won
+
+    def _search_box_random(self, pair_robots, pair_boxes):
+        """RobotRandom.search_box: a random unowned visible box"""
+        while len(pair_robots):
+            free = self.box_owner[pair_boxes] < 0
+            pair_robots, pair_boxes = pair_robots[free], pair_boxes[free]
+            if not len(pair_robots):
+                return
+            order = np.lexsort((self.rng.random(len(pair_robots)), pair_robots))
+            robots, first = np.unique(pair_robots[order], return_index=True)
+            boxes = pair_boxes[order[first]]
+
+            won = self._claim(robots, boxes)
+            self.target[robots[won]] = boxes[won]
+            self.box_owner[boxes[won]] = robots[won]
+            # losers pick again among the boxes still free
+            retry = np.isin(pair_robots, robots[~won])
+            pair_robots, pair_boxes = pair_robots[retry], pair_boxes[retry]
+
+    def _search_box_greedy(self, pair_robots, pair_boxes):
+        """RobotGreedy.search_box: lowest anticipated criticality, switching if it beats the current box"""
+        while len(pair_robots):
+            owner = self.box_owner[pair_boxes]
+            candidate = (owner < 0) | (owner == pair_robots)
+            pair_robots, pair_boxes = pair_robots[candidate], pair_boxes[candidate]
+            if not len(pair_robots):
+                return
+
+            # lowest anticipated criticality wins, first one on ties
+            criticalities = self._anticipated_criticality(pair_robots, pair_boxes)
+            order = np.lexsort((np.arange(len(pair_robots)), criticalities, pair_robots))
+            robots, first = np.unique(pair_robots[order], return_index=True)
+            boxes = pair_boxes[order[first]]
+            best = criticalities[order[first]]
+
+            # the box currently carried, else targeted, is kept unless the new one is strictly better
+            current = np.where(self.carry[robots] >= 0, self.carry[robots], self.target[robots])
+            holding = current >= 0
+            switch = ~holding
+            switch[holding] = best[holding] < self._anticipated_criticality(robots[holding], current[holding])
+            robots, boxes = robots[switch], boxes[switch]
+
+            won = self._claim(robots, boxes)
+            winners = robots[won]
+            # drop the carried box on spot / give up the targeted one
+            carried = winners[self.carry[winners] >= 0]
+            self.box_owner[self.carry[carried]] = -1
+            self.carry[carried] = -1
+            targeting = winners[self.target[winners] >= 0]
+            self.box_owner[self.target[targeting]] = -1
+            self.target[winners] = boxes[won]
+            self.box_owner[boxes[won]] = winners
+
+            retry = np.isin(pair_robots, robots[~won])
+            pair_robots, pair_boxes = pair_robots[retry], pair_boxes[retry]
+
+    def _update_carried_box_position(self, alive):
+        robots = np.flatnonzero(alive & (self.carry >= 0))
+        self.box_x[self.carry[robots]] = self.x[robots]
+        self.box_y[self.carry[robots]] = self.y[robots]
+
+    def _go_to_target_box(self, alive):
+        robots = np.flatnonzero(alive & (self.target >= 0))
+        boxes = self.target[robots]
+        self._move_towards_target(robots, self.box_x[boxes], self.box_y[boxes])
+
+    def _take_box(self, alive):
+        robots = np.flatnonzero(alive & (self.target >= 0))
+        boxes = self.target[robots]
+        taking = (self.box_x[boxes] == self.x[robots]) & (self.box_y[boxes] == self.y[robots])
+        self.carry[robots[taking]] = boxes[taking]
+        self.target[robots[taking]] = -1
+
+    def _carry_box_to_nest(self, alive):
+        robots = np.flatnonzero(alive & (self.carry >= 0))
+        nests = self.box_color[self.carry[robots]]
+        self.target_nest[robots] = nests
+        self._move_towards_target(robots, self.nest_x[nests], self.nest_y[nests])
+
+    def _drop_box_in_nest(self, alive):
+        robots = np.flatnonzero(alive & (self.carry >= 0) & (self.target_nest >= 0))
+        boxes = self.carry[robots]
+        nests = self.target_nest[robots]
+        x, y = self.x[robots], self.y[robots]
+        dropping = ((x == self.box_x[boxes]) & (y == self.box_y[boxes])
+                    & (x == self.nest_x[nests]) & (y == self.nest_y[nests]))
+        robots, boxes = robots[dropping], boxes[dropping]
+        if not len(robots):
+            return
+
+        rewards = np.where(self.box_color[boxes] == self.color[robots], self.REWARD, self.REDUCED_REWARD)
+        self.battery[robots] = np.minimum(self.battery[robots] + rewards, self.MAX_BATTERY)
+
+        # remove the boxes and clear the references of every robot targeting or carrying them
+        self.box_alive[boxes] = False
+        self.box_owner[boxes] = -1
+        self.box_count -= len(boxes)
+        self.target[np.isin(self.target, boxes)] = -1
+        self.carry[np.isin(self.carry, boxes)] = -1
+        self.target_nest[robots] = -1
+        log = self.event_log
+        if log.info:
+            for robot, box in zip(robots.tolist(), boxes.tolist()):
+                log.emit(log.INFO, "drop_box", robot=robot, box=box, battery=int(self.battery[robot]))
+
+    def _die(self):
+        dead = self.battery <= self.MIN_BATTERY
+        for held in (self.carry, self.target):
+            released = dead & (held >= 0)
+            self.box_owner[held[released]] = -1
+            held[released] = -1
+        self.color[dead] = -1  # gray
+
+    # ----- box spawning -----
+    def _boxes_due(self):
+        """Number of boxes to spawn at this step, same schedule as CoCaRoModel"""
+        if self.box_spawn_rate is not None:
+            return int(self.rng.poisson(self.box_spawn_rate))
+        if self.steps > 0 and self.steps % self.box_spawn_interval == 0:
+            return self.boxes_per_spawn
+        return 0
+
+    def _spawn_boxes(self, count):
+        """Spawn count boxes with random colors on cells without robots, boxes or nests"""
+        if not count:
+            return
+        occupied = np.zeros((self.width, self.height), dtype=bool)
+        occupied[self.x, self.y] = True
+        live = self.box_alive[:self.box_total]
+        occupied[self.box_x[:self.box_total][live], self.box_y[:self.box_total][live]] = True
+        occupied[self.nest_x, self.nest_y] = True
+
+        xs, ys = [], []
+        for _ in range(count):
+            cell = self._pick_spawn_cell(occupied)
+            if cell is None:
+                break
+            occupied[cell] = True
+            xs.append(cell[0])
+            ys.append(cell[1])
+        self._add_boxes(np.array(xs, dtype=np.int64), np.array(ys, dtype=np.int64),
+                        self.rng.integers(0, len(self.colors), len(xs)))
+
+    def _pick_spawn_cell(self, occupied, attempts=8):
+        """Random free cell, near a random hotspot if any are configured, None if the grid is full"""
+        if self.box_hotspots:
+            hotspot_x, hotspot_y = self.box_hotspots[self.rng.integers(len(self.box_hotspots))]
+            radius = self.hotspot_radius
+            for _ in range(attempts):
+                x = hotspot_x + int(self.rng.integers(-radius, radius + 1))
+                y = hotspot_y + int(self.rng.integers(-radius, radius + 1))
+                if 0 <= x < self.width and 0 <= y < self.height and not occupied[x, y]:
+                    return x, y
+        # rejection sampling is enough while the grid is mostly free
+        for _ in range(attempts):
+            x, y = int(self.rng.integers(self.width)), int(self.rng.integers(self.height))
+            if not occupied[x, y]:
+                return x, y
+        free = np.flatnonzero(~occupied)
+        if not len(free):
+            return None
+        return tuple(int(v) for v in np.unravel_index(self.rng.choice(free), occupied.shape))
+
+
+def _resize(array, size, fill):
+    extra = np.full(size - len(array), fill, dtype=array.dtype)
+    return np.concatenate([array, extra])
+
+
+# Test it
+if __name__ == "__main__":
+    import time
+
+    from model import CoCaRoModel
+
+    # same rules: the agent and array models should end up close on average
+    print("=== Agents vs arrays (90 robots, 18 boxes, 50x50, 300 steps, 5 seeds) ===")
+    for robot_type in ArrayCoCaRoModel.ROBOT_TYPES:
+        for model_class in (CoCaRoModel, ArrayCoCaRoModel):
+            finals = []
+            for seed in range(5):
+                model = model_class(robot_type, robot_num=90, box_num=18, seed=seed, collect_interval=300)
+                for _ in range(300):
+                    model.step()
+                finals.append(model.data_collector.get_model_vars_dataframe().iloc[-1])
+            boxes = np.mean([row["BoxCount"] for row in finals])
+            battery = np.mean([row["MeanBatteryLevel"] for row in finals])
+            alive = np.mean([row["AliveRobots"] for row in finals])
+            print(f"{robot_type:8} {model_class.__name__:17} boxes={boxes:6.1f} "
+                  f"battery={battery:6.1f} alive={alive:5.1f}")
+
+    print("\n=== 10k robots, 2k boxes, 500x500 ===")
+    model = ArrayCoCaRoModel("GREEDY", robot_num=10_000, box_num=2_000, width=500, height=500, seed=42,
+                             boxes_per_spawn=30)
+    start = time.perf_counter()
+    for _ in range(100):
+        model.step()
+    elapsed = time.perf_counter() - start
+    print(f"100 steps in {elapsed:.2f}s ({100 / elapsed:.1f} steps/sec), "
+          f"{model.box_count} boxes, {model.alive_robot_count} alive robots")
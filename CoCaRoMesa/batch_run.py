@@ -1 +1,102 @@
-# could contain the code to run the model multiple times
\ No newline at end of file
+"""Parallel parameter sweeps of CoCaRoModel over a process pool.
+
+Every combination of the swept parameters is one run, identified by a run id
+built from its parameters, its number of steps and its collect interval.
+Runs are spread across worker processes and each result is appended to the
+ResultStore in <output-dir> as soon as it comes back. Re-running the same
+sweep skips the runs already in the store, so an interrupted sweep resumes
+where it stopped.
+
+Example:
+    python batch_run.py --robot-types GREEDY COOPERATIVE --seeds 100 --steps 1000 --workers 8
+"""
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from array_model import ArrayCoCaRoModel
+from result_store import ResultStore
+from run import ENGINES, ROBOT_TYPES, run_id, run_model
+
+
+def expand_grid(robot_types, robot_nums, box_nums, sizes, seeds, engine="agents"):
+    """All parameter combinations of the sweep, as run_model keyword dicts"""
+    return [
+        dict(robot_type=robot_type, robot_num=robot_num, box_num=box_num, width=width, height=height, seed=seed,
+             engine=engine)
+        for robot_type, robot_num, box_num, (width, height), seed
+        in itertools.product(robot_types, robot_nums, box_nums, sizes, seeds)
+    ]
+
+
+def execute_run(params, steps, collect_interval):
+    """Worker: run one model and return its id, parameters, metrics and wall time"""
+    model, elapsed = run_model(steps, collect_interval=collect_interval, **params)
+    df = model.data_collector.get_model_vars_dataframe()
+    return run_id(params, steps, collect_interval), params, df, elapsed
+
+
+def run_sweep(param_grid, steps, output_dir, workers=None, collect_interval=1):
+    """Run every pending combination of param_grid, yielding (run_id, params, df) as runs finish"""
+    store = ResultStore(output_dir)
+    pending = [params for params in param_grid
+               if not store.has_run(params["robot_type"], run_id(params, steps, collect_interval))]
+    skipped = len(param_grid) - len(pending)
+    if skipped:
+        print(f"resuming: {skipped} of {len(param_grid)} runs already done")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(execute_run, params, steps, collect_interval) for params in pending]
+        for done, future in enumerate(as_completed(futures), start=1):
+            rid, params, df, elapsed = future.result()
+            metadata = {**params, "steps": steps, "collect_interval": collect_interval, "elapsed": elapsed}
+            store.append_model_vars(params["robot_type"], rid, df, metadata)
+            print(f"[{done}/{len(pending)}] {rid} done in {elapsed:.1f}s")
+            yield rid, params, df
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep of CoCaRoModel")
+    parser.add_argument("--robot-types", nargs="+", default=None, choices=ROBOT_TYPES,
+                        help="default: RANDOM GREEDY COOPERATIVE, RANDOM GREEDY with --engine arrays")
+    parser.add_argument("--robots", nargs="+", type=int, default=[90], help="robot counts to sweep")
+    parser.add_argument("--boxes", nargs="+", type=int, default=[18], help="initial box counts to sweep")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[50], help="square grid sizes to sweep")
+    parser.add_argument("--engine", default="agents", choices=list(ENGINES))
+    parser.add_argument("--seeds", type=int, default=10, help="number of replicates per combination")
+    parser.add_argument("--seed-start", type=int, default=0, help="first seed, replicates use consecutive seeds")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--collect-interval", type=int, default=1, help="collect metrics every N steps")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--output-dir", default="sweep_results")
+    args = parser.parse_args(argv)
+    if args.engine == "arrays":
+        if args.robot_types is None:
+            args.robot_types = list(ArrayCoCaRoModel.ROBOT_TYPES)
+        unsupported = [robot_type for robot_type in args.robot_types
+                       if robot_type not in ArrayCoCaRoModel.ROBOT_TYPES]
+        if unsupported:
+            parser.error(f"--engine arrays supports {', '.join(ArrayCoCaRoModel.ROBOT_TYPES)}, "
+                         f"not {', '.join(unsupported)}")
+    elif args.robot_types is None:
+        args.robot_types = ["RANDOM", "GREEDY", "COOPERATIVE"]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    param_grid = expand_grid(
+        args.robot_types,
+        args.robots,
+        args.boxes,
+        [(size, size) for size in args.sizes],
+        range(args.seed_start, args.seed_start + args.seeds),
+        args.engine,
+    )
+    for _ in run_sweep(param_grid, args.steps, args.output_dir, args.workers, args.collect_interval):
+        pass
+    print(f"sweep complete: results in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
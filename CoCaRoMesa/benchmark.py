@@ -0,0 +1,171 @@
+"""Step-throughput benchmarks of CoCaRoModel, with a per-phase breakdown.
+
+Every case is one robot type on a square grid with a robot count (and one
+initial box per 5 robots). Throughput is the best of --repeats plain runs of
+--steps steps, after --warmup steps. The phase breakdown comes from one more
+run of the same seed under profiling.Profiler, counting each phase's self
+time; the profiler's wrappers cost time of their own, so that run is not
+used for throughput.
+
+Results can be saved as a JSON baseline. Given a baseline, the suite fails
+(exit status 1) when a case's steps/sec falls more than --threshold below
+it. Baselines are only comparable on the same machine.
+
+Example:
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json --threshold 0.15
+    python benchmark.py --robot-types GREEDY --sizes 500 --robots 10000 --steps 10
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import platform
+import sys
+import time
+
+import mesa
+from mesa.datacollection import DataCollector
+
+from component_system import ComponentSystems
+from message_bus import MessageBus
+from model import CoCaRoModel
+from rl import QLearning
+from run import ROBOT_TYPES
+
+ROBOT = "robot"  # stands for the benchmarked robot type in PHASES
+# phase -> profiled methods whose self time counts toward it; the rest is "other"
+PHASES = {
+    "update_reachable_boxes": [(ROBOT, "update_reachable_boxes")],
+    "search_box": [(ROBOT, "search_box")],
+    "rl_batch": [(QLearning, "step")],
+    "messages": [(ROBOT, "read_requests"), (ROBOT, "read_agrees"), (ROBOT, "read_refuses"),
+                 (ROBOT, "read_informs"), (MessageBus, "deliver")],
+    "movement": [(ROBOT, "wander"), (ROBOT, "update_carried_box_position"), (ROBOT, "go_to_target_box"),
+                 (ROBOT, "carry_box_to_nest")],
+    "delivery": [(ROBOT, "take_box"), (ROBOT, "drop_box_in_nest")],
+    "battery": [(ROBOT, "update_battery"), (ROBOT, "die")],
+    "component_systems": [(ComponentSystems, "step")],
+    "box_spawn": [(CoCaRoModel, "_spawn_new_box")],
+    "data_collection": [(DataCollector, "collect")],
+}
+
+
+def phase_seconds(profiler, robot_type):
+    """Self time of the PHASES of a profiled run, in seconds"""
+    self_times = {f"{row['owner']}.{row['phase']}": row["self_s"] for row in profiler.phases()}
+    totals = {}
+    for phase, methods in PHASES.items():
+        labels = [f"{robot_type if owner is ROBOT else owner.__name__}.{name}" for owner, name in methods]
+        totals[phase] = sum(self_times.get(label, 0.0) for label in labels)
+    return totals
+
+
+def case_id(robot_type, size, robot_num):
+    return f"{robot_type}_{size}x{size}_r{robot_num}"
+
+
+def _timed_run(params, steps, warmup, profile=False):
+    """Seconds taken by steps steps after warmup steps, and their Profiler if profile"""
+    model = CoCaRoModel(**params)
+    for _ in range(warmup):
+        model.step()
+    profiler = model.profile() if profile else None
+    with profiler or contextlib.nullcontext():
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        return time.perf_counter() - start, profiler
+
+
+def run_case(robot_type, size, robot_num, steps=50, warmup=10, repeats=3, seed=42):
+    """Throughput and per-phase time of one case"""
+    params = dict(robot_type=robot_type, robot_num=robot_num, box_num=max(1, robot_num // 5),
+                  width=size, height=size, seed=seed)
+    elapsed = min(_timed_run(params, steps, warmup)[0] for _ in range(repeats))
+
+    instrumented, profiler = _timed_run(params, steps, warmup, profile=True)
+    phase_ms = {phase: 1000 * total / steps for phase, total in phase_seconds(profiler, robot_type).items() if total}
+    phase_ms["other"] = max(0.0, 1000 * instrumented / steps - sum(phase_ms.values()))
+    return {
+        "case": case_id(robot_type, size, robot_num),
+        **params,
+        "steps": steps,
+        "steps_per_sec": steps / elapsed,
+        "ms_per_step": 1000 * elapsed / steps,
+        "phase_ms_per_step": phase_ms,  # instrumented run
+    }
+
+
+def run_suite(robot_types, sizes, robot_nums, **case_params):
+    """Run every case and return their results"""
+    results = []
+    for robot_type, size, robot_num in itertools.product(robot_types, sizes, robot_nums):
+        result = run_case(robot_type, size, robot_num, **case_params)
+        results.append(result)
+        phases = sorted(result["phase_ms_per_step"].items(), key=lambda item: -item[1])
+        total = sum(ms for _, ms in phases)
+        breakdown = ", ".join(f"{phase} {ms / total:.0%}" for phase, ms in phases[:4] if ms)
+        print(f"{result['case']:32} {result['steps_per_sec']:9.1f} steps/s  {result['ms_per_step']:9.2f} ms/step"
+              f"  [{breakdown}]")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Cases whose throughput fell more than threshold below the baseline, as (case, ratio)"""
+    baseline_rates = {case["case"]: case["steps_per_sec"] for case in baseline["cases"]}
+    regressions = []
+    for result in results:
+        reference = baseline_rates.get(result["case"])
+        if reference is None:
+            continue
+        ratio = result["steps_per_sec"] / reference
+        if ratio < 1 - threshold:
+            regressions.append((result["case"], ratio))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Step-throughput benchmarks of CoCaRoModel")
+    parser.add_argument("--robot-types", nargs="+", default=["RANDOM", "GREEDY", "COOPERATIVE", "SAPHESIA", "RL"],
+                        choices=ROBOT_TYPES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 50, 100, 500], help="square grid sizes")
+    parser.add_argument("--robots", nargs="+", type=int, default=[10, 100, 1000], help="robot counts")
+    parser.add_argument("--steps", type=int, default=50, help="timed steps per run")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed steps before timing")
+    parser.add_argument("--repeats", type=int, default=3, help="plain runs per case, the fastest counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="fail when steps/sec drops by more than this fraction of the baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_suite(args.robot_types, args.sizes, args.robots, steps=args.steps, warmup=args.warmup,
+                        repeats=args.repeats, seed=args.seed)
+    if args.save:
+        report = {
+            "python": platform.python_version(),
+            "mesa": mesa.__version__,
+            "machine": platform.platform(),
+            "cases": results,
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, ratio in regressions:
+            print(f"REGRESSION {case}: {ratio:.0%} of baseline steps/sec")
+        if regressions:
+            return 1
+        print(f"no regression beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""SAPHESIA component systems, ported from CoCaRoGama/robot_saphesia.gaml.
+
+The robots of one color form a component system. A system whose share of
+dying robots exceeds CRITICALITY_THRESHOLD_NEEDS_HELP asks the other systems
+for help; a system with a dying share under CRITICALITY_THRESHOLD_CAN_HELP
+agrees, and from then on its robots get the full reward for boxes of the
+requester's color.
+
+GAMA rebuilds each system's robot and dying-robot lists every cycle by
+filtering the whole population. Here every system keeps alive and dying
+counts, updated by the robots' battery setter when a battery crosses the
+dying threshold or reaches zero, so a step of the systems costs O(colors^2)
+whatever the number of robots.
+"""
+import numpy as np
+
+
+# SApHESIA parameters (from the research paper)
+BATTERY_DYING_THRESHOLD = 1.0 / 3.0        # dying below max_battery / 3
+CRITICALITY_THRESHOLD_NEEDS_HELP = 0.3     # needs help above 30% dying robots
+CRITICALITY_THRESHOLD_CAN_HELP = 0.7       # can help under 70% dying robots (not in the paper)
+
+
+#  ===== COMPONENT SYSTEM =====
+class ComponentSystem:
+    def __init__(self, systems, color, dying_battery):
+        self.systems = systems
+        self.color = color
+        self.dying_battery = dying_battery
+        self.alive_count = 0
+        self.dying_count = 0
+        self.is_helping = False
+        self.helped_colors = set()
+        # helped color indices, for vectorized reward lookups
+        self.full_reward = np.zeros(len(systems.colors), dtype=bool)
+        if color in systems.color_index:
+            self.full_reward[systems.color_index[color]] = True
+        self.requests = []  # colors of the systems that asked for help at the last step
+        self.linked_systems = []
+
+    def _is_dying(self, battery):
+        return 0 < battery < self.dying_battery
+
+    def add_robot(self, battery):
+        self.alive_count += battery > 0
+        self.dying_count += self._is_dying(battery)
+
+    def battery_changed(self, old_battery, new_battery):
+        """Keep the counts up to date, O(1)"""
+        self.alive_count += (new_battery > 0) - (old_battery > 0)
+        self.dying_count += self._is_dying(new_battery) - self._is_dying(old_battery)
+
+    @property
+    def component_criticality(self):
+        return self.dying_count
+
+    @property
+    def criticality_ratio(self):
+        return self.dying_count / self.alive_count if self.alive_count else 0.0
+
+    @property
+    def needs_help(self):
+        return self.criticality_ratio > CRITICALITY_THRESHOLD_NEEDS_HELP
+
+    def help_system(self, target_system):
+        self.helped_colors.add(target_system.color)
+        self.full_reward[self.systems.color_index[target_system.color]] = True
+        self.is_helping = True
+
+    def stop_helping(self, target_system):
+        self.helped_colors.discard(target_system.color)
+        self.full_reward[self.systems.color_index[target_system.color]] = False
+        self.is_helping = False
+
+    def request_help(self):
+        """Ask every system able to help, when in a critical state"""
+        if not self.needs_help or self.is_helping:
+            return
+        for target_system in self.linked_systems:
+            if not target_system.is_helping and target_system.criticality_ratio < CRITICALITY_THRESHOLD_CAN_HELP:
+                self.systems.send_request(self, target_system)
+
+    def process_requests(self):
+        log = self.systems.model.event_log
+        for requester_color in self.requests:
+            requester = self.systems.by_color[requester_color]
+            if self.criticality_ratio < CRITICALITY_THRESHOLD_CAN_HELP:
+                self.help_system(requester)
+                if log.info:
+                    log.emit(log.INFO, "help_accepted", system=self.color, requester=requester_color)
+            elif log.info:
+                log.emit(log.INFO, "help_refused", system=self.color, requester=requester_color)
+        self.requests.clear()
+
+
+#  ===== COMPONENT SYSTEMS =====
+class ComponentSystems:
+    """One component system per color, and the help requests between them
+
+    Requests sent during a step are processed by their target at the next
+    step, whatever the order the systems run in.
+    """
+
+    def __init__(self, model, colors, max_battery):
+        self.model = model
+        self.colors = list(colors)
+        self.color_index = {color: i for i, color in enumerate(self.colors)}
+        dying_battery = max_battery * BATTERY_DYING_THRESHOLD
+        self.by_color = {color: ComponentSystem(self, color, dying_battery) for color in self.colors}
+        for system in self.by_color.values():
+            system.linked_systems = [other for other in self.by_color.values() if other is not system]
+        # never stepped: robots built without a system color (dead robots restored from another robot type)
+        self.detached = ComponentSystem(self, None, dying_battery)
+        self.robot_count = 0
+        self._outbox = []  # (target system, requester color) sent this step
+
+    def __getitem__(self, color):
+        return self.by_color[color]
+
+    def __iter__(self):
+        return iter(self.by_color.values())
+
+    def add_robot(self, color, battery):
+        """Register a robot with the system of its color, and return that system"""
+        self.robot_count += 1
+        system = self.by_color.get(color, self.detached)
+        system.add_robot(battery)
+        return system
+
+    def recount(self, robots):
+        """Rebuild every system's counts from robots, e.g. after batteries were set directly"""
+        for system in [*self, self.detached]:
+            system.alive_count = system.dying_count = 0
+        for robot in robots:
+            robot.system.add_robot(robot.battery)
+
+    def send_request(self, requester, target_system):
+        self._outbox.append((target_system, requester.color))
+        log = self.model.event_log
+        if log.info:
+            log.emit(log.INFO, "help_request", system=requester.color, target=target_system.color,
+                     dying=requester.dying_count)
+
+    def step(self):
+        for system in self:
+            system.request_help()
+            system.process_requests()
+        # requests sent during this step are read at the next one
+        for target_system, requester_color in self._outbox:
+            target_system.requests.append(requester_color)
+        self._outbox.clear()
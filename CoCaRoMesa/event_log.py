@@ -0,0 +1,79 @@
+import json
+import pickle
+import sys
+
+
+#  ===== EVENT LOG =====
+class EventLog:
+    """Level-gated, structured event log of a model run
+
+    Call sites check the precomputed `debug`/`info` flags before building an
+    event, so a disabled log costs one attribute lookup per call site.
+    Events go to stdout as text, or to a file: JSON lines for a `.jsonl` path,
+    a stream of pickled dicts for any other path (see read_events).
+    """
+
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    OFF = 100
+    LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "off": OFF}
+
+    def __init__(self, model, level="off", path=None):
+        self.model = model
+        self.level = self.LEVELS[level] if isinstance(level, str) else level
+        self.debug = self.level <= self.DEBUG
+        self.info = self.level <= self.INFO
+        self.warning = self.level <= self.WARNING
+        self.path = path
+        self._file = None
+        self._write = self._write_text
+        if path is not None and self.level < self.OFF:
+            if str(path).endswith(".jsonl"):
+                self._file = open(path, "w", encoding="utf-8")
+                self._write = self._write_jsonl
+            else:
+                self._file = open(path, "wb")
+                self._write = self._write_binary
+
+    def emit(self, level, event, agent=None, **fields):
+        """Record an event; agent is the acting agent, if any"""
+        if level < self.level:
+            return
+        record = {"step": self.model.steps, "level": level, "event": event}
+        if agent is not None:
+            record["agent"] = agent.unique_id
+        record.update(fields)
+        self._write(record)
+
+    def _write_text(self, record):
+        fields = " ".join(f"{key}={value}" for key, value in record.items()
+                          if key not in ("step", "level", "event"))
+        print(f"[{record['step']}] {record['event']} {fields}", file=sys.stdout)
+
+    def _write_jsonl(self, record):
+        self._file.write(json.dumps(record, default=str))
+        self._file.write("\n")
+
+    def _write_binary(self, record):
+        pickle.dump(record, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_events(path):
+    """Iterate over the events of a log file written by EventLog"""
+    if str(path).endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    else:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
@@ -0,0 +1,129 @@
+"""Per-agent memory footprint and allocation churn of CoCaRoModel.
+
+Footprints are the traced bytes retained per agent created, model-side
+indices (AgentSet, cell lists, box index, free cells) included. Churn is
+measured over a full run: peak traced memory, and Python's generation-0
+garbage collections, which run once per gen-0 threshold net allocations of
+container objects (agents, their __dict__s, lists), so collections per step
+tracks how fast the run allocates objects.
+
+Every agent class is measured twice: as it is, and as an unslotted control
+that shadows each slot with a class attribute, so the slotted attributes
+land in the instance __dict__ as they did before the classes declared
+__slots__. The control still carries the unused slot fields, 8 bytes each,
+which the reported saving takes off.
+
+Example:
+    python memory_benchmark.py --robot-type GREEDY --steps 1000 --json memory.json
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from agents.box import Box
+from agents.nest import Nest
+from model import CoCaRoModel
+from run import ROBOT_TYPES
+
+
+def slot_names(agent_class):
+    """Every attribute slotted by agent_class and its bases"""
+    return [name for klass in agent_class.__mro__ for name in klass.__dict__.get("__slots__", ())]
+
+
+def unslotted(agent_class):
+    """Subclass of agent_class keeping the slotted attributes in the instance __dict__
+
+    A class attribute that is not a data descriptor hides the slot
+    descriptor of the base class, so getting and setting the name goes
+    through the instance __dict__.
+    """
+    shadows = {name: None for name in slot_names(agent_class)}
+    return type(f"Unslotted{agent_class.__name__}", (agent_class,), {"__module__": __name__, **shadows})
+
+
+def agent_footprint(robot_type, agent_class, count, seed=None):
+    """Traced bytes retained per agent, for count agents of agent_class added to a fresh model"""
+    model = CoCaRoModel(robot_type, robot_num=3, box_num=0, seed=seed)
+    cells = model.grid.all_cells.cells
+    colors = model.colors
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    agents = [agent_class(model, colors[i % 3], cells[i % len(cells)]) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # the list holding the agents is not part of their footprint
+    return (after - before) / len(agents) - 8
+
+
+def footprints(robot_type, count, seed=None):
+    """Footprint of each agent class, slotted and unslotted, each measured on its own model"""
+    robot_class = CoCaRoModel.robot_classes[robot_type]
+    results = {}
+    for agent_class in (Box, Nest, robot_class):
+        slotted = agent_footprint(robot_type, agent_class, count, seed)
+        control = agent_footprint(robot_type, unslotted(agent_class), count, seed)
+        results[agent_class.__name__] = {
+            "slotted": slotted,
+            "unslotted": control,
+            "saved": control - 8 * len(slot_names(agent_class)) - slotted,
+        }
+    return results
+
+
+def run_churn(robot_type, steps, robot_num=90, box_num=18, seed=None):
+    """Run the model for steps steps and report its memory peak and allocation churn"""
+    model = CoCaRoModel(robot_type, robot_num=robot_num, box_num=box_num, seed=seed)
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.step()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    collections = gc.get_stats()[0]["collections"] - collections
+    return {
+        "steps": steps,
+        "boxes_at_end": model.metrics.box_count,
+        "peak_traced_kb": (peak - start_memory) / 1024,
+        "retained_kb": (current - start_memory) / 1024,
+        "gen0_collections": collections,
+        "gen0_collections_per_1000_steps": 1000 * collections / steps,
+        "elapsed_traced_s": elapsed,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Agent memory footprint and allocation churn of CoCaRoModel")
+    parser.add_argument("--robot-type", default="GREEDY", choices=ROBOT_TYPES)
+    parser.add_argument("--agents", type=int, default=10_000, help="agents created per footprint measurement")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {
+        "footprint_bytes": footprints(args.robot_type, args.agents, args.seed),
+        "run": run_churn(args.robot_type, args.steps, seed=args.seed),
+    }
+    print(f"{'bytes/agent':18} {'slotted':>9} {'unslotted':>9} {'saved':>9}")
+    for name, sizes in results["footprint_bytes"].items():
+        print(f"{name:18} {sizes['slotted']:9.0f} {sizes['unslotted']:9.0f} {sizes['saved']:9.0f}")
+    for key, value in results["run"].items():
+        print(f"{key:32} {value:10.1f}" if isinstance(value, float) else f"{key:32} {value:10}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
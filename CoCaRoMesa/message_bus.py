@@ -0,0 +1,92 @@
+from array import array
+from collections import namedtuple
+
+
+Message = namedtuple("Message", ["sender", "performative", "content"])
+
+
+class _Outbox:
+    """Messages sent during one step, stored column-wise"""
+
+    def __init__(self):
+        self.to_ids = array("q")
+        self.senders = array("q")
+        self.performatives = array("B")
+        self.contents = []
+
+    def __len__(self):
+        return len(self.to_ids)
+
+    def clear(self):
+        del self.to_ids[:]
+        del self.senders[:]
+        del self.performatives[:]
+        self.contents.clear()
+
+
+#  ===== MESSAGE BUS =====
+class MessageBus:
+    """Routes messages between agents through an id -> agent index
+
+    Sent messages are buffered and only reach the recipients' inboxes when the
+    model calls deliver() between steps, so what a robot reads never depends
+    on the activation order of the current step.
+    """
+
+    def __init__(self, performative_num=4):
+        self._agents_by_id = {}
+        self._outbox = _Outbox()
+        self._spare_outbox = _Outbox()
+        self.step_counts = [0] * performative_num   # messages delivered at the last step, per performative code
+        self.dropped = 0                            # messages whose recipient left the model before delivery
+
+    def register(self, agent):
+        self._agents_by_id[agent.unique_id] = agent
+
+    def unregister(self, agent):
+        self._agents_by_id.pop(agent.unique_id, None)
+
+    def get_agent(self, unique_id):
+        """Return the agent with this id, or None if it is not in the model"""
+        return self._agents_by_id.get(unique_id)
+
+    def send(self, sender_id, to_id, performative, content):
+        """Buffer a message until the next delivery phase"""
+        outbox = self._outbox
+        outbox.to_ids.append(to_id)
+        outbox.senders.append(sender_id)
+        outbox.performatives.append(performative)
+        outbox.contents.append(content)
+
+    def pending(self):
+        """(to_id, sender_id, performative, content) of the messages waiting for delivery"""
+        outbox = self._outbox
+        return zip(outbox.to_ids, outbox.senders, outbox.performatives, outbox.contents)
+
+    @property
+    def pending_count(self):
+        return len(self._outbox)
+
+    @property
+    def message_count(self):
+        return sum(self.step_counts)
+
+    def deliver(self):
+        """Swap the buffers and move every pending message into its recipient's inbox"""
+        outbox, self._outbox = self._outbox, self._spare_outbox
+        counts = self.step_counts
+        for code in range(len(counts)):
+            counts[code] = 0
+
+        agents_by_id = self._agents_by_id
+        for to_id, sender_id, code, content in zip(
+                outbox.to_ids, outbox.senders, outbox.performatives, outbox.contents):
+            recipient = agents_by_id.get(to_id)
+            if recipient is None:
+                self.dropped += 1
+                continue
+            recipient.inboxes[code].append(Message(sender_id, code, content))
+            counts[code] += 1
+
+        outbox.clear()
+        self._spare_outbox = outbox
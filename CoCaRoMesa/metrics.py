@@ -0,0 +1,37 @@
+#  ===== RUN METRICS =====
+class RunMetrics:
+    """Population counters kept up to date as agents change
+
+    Boxes are counted when they are registered/deregistered with the model,
+    robots report their battery changes through the battery setter, so the
+    DataCollector reporters read O(1) values instead of walking every agent.
+    """
+
+    def __init__(self):
+        self.box_count = 0
+        self.robot_count = 0
+        self.alive_robot_count = 0
+        self.battery_total = 0
+
+    def add_box(self):
+        self.box_count += 1
+
+    def remove_box(self):
+        self.box_count -= 1
+
+    def add_robot(self, battery):
+        self.robot_count += 1
+        self.battery_total += battery
+        if battery > 0:
+            self.alive_robot_count += 1
+
+    def battery_changed(self, old_battery, new_battery):
+        self.battery_total += new_battery - old_battery
+        if old_battery > 0 >= new_battery:  # robot died
+            self.alive_robot_count -= 1
+        elif new_battery > 0 >= old_battery:
+            self.alive_robot_count += 1
+
+    @property
+    def mean_battery(self):
+        return self.battery_total / self.robot_count if self.robot_count else 0
@@ -1,4 +1,6 @@
 import mesa
+from mesa.agent import AgentSet
+import numpy as np
 from mesa.discrete_space import OrthogonalVonNeumannGrid
 from mesa.datacollection import DataCollector
 
@@ -8,37 +10,150 @@ from agents.robot_base import RobotBase
 from agents.robot_cooperative import RobotCooperative
 from agents.robot_greedy import RobotGreedy
 from agents.robot_random import RobotRandom
+from agents.robot_rl import RobotRL
 from agents.robot_saphesia import RobotSaphesia
+from component_system import ComponentSystems
+from event_log import EventLog
+from message_bus import MessageBus
+from metrics import RunMetrics
+from navigation import Navigator
+from profiling import Profiler
+from rl import QLearning
+from snapshot import ModelSnapshot
+from spatial_index import BoxIndex, FreeCells
 
 
 class CoCaRoModel(mesa.Model):
-    def __init__(self, robot_type, robot_num, box_num, width=50, height=50, seed=None):
+    # robot type -> robot class
+    robot_classes = {
+        "RANDOM": RobotRandom,
+        "GREEDY": RobotGreedy,
+        "COOPERATIVE": RobotCooperative,
+        "SAPHESIA": RobotSaphesia,
+        "RL": RobotRL,
+    }
+    # nest cells as fractions of the grid size: (15, 15), (35, 15) and (25, 32) on the default 50x50 grid
+    nest_locations = ((0.3, 0.3), (0.7, 0.3), (0.5, 0.64))
+
+    def __init__(self, robot_type, robot_num, box_num, width=50, height=50, seed=None, collect_interval=1,
+                 log_level="off", log_path=None, box_spawn_interval=3, boxes_per_spawn=1, box_spawn_rate=None,
+                 box_hotspots=None, hotspot_radius=3, rl_params=None, grid=None,
+                 snapshot=None, activation="active", blocked_cells=None):
         super().__init__(seed=seed)
-        self.grid = OrthogonalVonNeumannGrid( (width, height), random=self.random)
+        # structured event log, off by default so headless runs pay nothing
+        self.event_log = EventLog(self, level=log_level, path=log_path)
+        if grid is None:
+            grid = OrthogonalVonNeumannGrid( (width, height), random=self.random)
+        else:
+            # grid of a finished run, reused to skip connecting its cells again (vec_env resets)
+            self.recycle_grid(grid)
+        self.grid = grid
+        # cells without agents, updated as agents move, used to spawn boxes
+        self.free_cells = FreeCells(self.grid.all_cells)
+        # shortest-path next hops for robots heading to nests and boxes
+        self.navigation = Navigator(self.grid, free_cells=self.free_cells)
+        # optional (x, y) obstacles, blocked before any agent is placed
+        if blocked_cells:
+            self.navigation.block([self.grid[tuple(coordinate)] for coordinate in blocked_cells])
         self.robot_type = robot_type
         self.robot_num = robot_num
         self.box_num = box_num
-        # Track steps for dynamic box spawning
-        self.box_spawn_interval = 3
+        # Box spawning schedule: boxes_per_spawn boxes every box_spawn_interval steps,
+        # or Poisson arrivals with box_spawn_rate boxes per step on average
+        self.box_spawn_interval = box_spawn_interval
+        self.boxes_per_spawn = boxes_per_spawn
+        self.box_spawn_rate = box_spawn_rate
+        # optional (x, y) hotspots new boxes cluster around, within hotspot_radius
+        self.box_hotspots = [tuple(hotspot) for hotspot in box_hotspots] if box_hotspots else []
+        self.hotspot_radius = hotspot_radius
         self.colors = ["red", "green", "blue"]
+        # id -> agent index used to route cooperative messages
+        self.message_bus = MessageBus()
+        # batched box selection and learning of RL robots, rl_params are QLearning keyword arguments
+        self.q_learning = QLearning(self, **(rl_params or {}))
+        # SAPHESIA component systems, one per color, with incrementally updated alive and dying counts
+        self.component_systems = ComponentSystems(self, self.colors, RobotBase.max_battery)
+        # box-only spatial index used by robot vision queries
+        self.box_index = BoxIndex()
+        # counters behind the DataCollector reporters
+        self.metrics = RunMetrics()
+        # collect data every collect_interval steps
+        self.collect_interval = collect_interval
+        # Profiler of the last profile() block, phases are only timed inside one
+        self.profiler = None
+        # "active": step the living robots only, in random order; "all": step every agent, dead robots,
+        # boxes and nests included, like the original scheduler (same seeds, same runs as before)
+        if activation not in ("active", "all"):
+            raise ValueError(f"activation must be 'active' or 'all', not {activation!r}")
+        self.activation = activation
+        # living robots, in creation order; robots leave it when they die
+        self.active_robots = AgentSet([], random=self.random)
 
-        self.initialize_nests()
-        self.initialize_boxes()
-        self.initialize_robots()
+        if snapshot is None:
+            self.initialize_nests()
+            self.initialize_boxes()
+            self.initialize_robots()
 
         self.data_collector = DataCollector(
             model_reporters={
-                "BoxCount": lambda m: sum(isinstance(b, Box) for b in m.agents),
-                "MeanBatteryLevel": lambda m: (
-                    sum(robot.battery for robot in m.get_robots()) / len(m.get_robots())
-                    if m.get_robots()  # non-empty list is truthy
-                    else 0
-                ),
-                "AliveRobots": lambda m: len([
-                    r for r in m.get_robots() if r.battery > 0
-                ]),
+                "Step": lambda m: m.steps,
+                "BoxCount": lambda m: m.metrics.box_count,
+                "MeanBatteryLevel": lambda m: m.metrics.mean_battery,
+                "AliveRobots": lambda m: m.metrics.alive_robot_count,
+                "Messages": lambda m: m.message_bus.message_count,
             }
         )
+        if snapshot is not None:
+            # agents, counters, random generators and collected data of a snapshot's run
+            snapshot.restore(self)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, **overrides):
+        """Model resuming a snapshot's run; overrides change its parameters, e.g. robot_type"""
+        params = dict(snapshot.params, **overrides)
+        return cls(**params, snapshot=snapshot)
+
+    def snapshot(self):
+        """Array-backed copy of the model's state, see snapshot.py"""
+        return ModelSnapshot.take(self)
+
+    def fork(self, n, **overrides):
+        """n independent copies of the model, continuing from its current state"""
+        snapshot = self.snapshot()
+        return [self.from_snapshot(snapshot, **overrides) for _ in range(n)]
+
+    def profile(self):
+        """Context manager timing the phases of the steps run inside it, see profiling.py"""
+        self.profiler = Profiler(self)
+        return self.profiler
+
+    def recycle_grid(self, grid):
+        """Empty grid and bind it to this model's random generator
+
+        The model that used the grid before must not be stepped anymore.
+        """
+        grid.random = self.random
+        grid.all_cells.random = self.random
+        for cell in grid.all_cells:
+            cell._agents.clear()
+            cell.random = self.random
+
+    def register_agent(self, agent):
+        super().register_agent(agent)
+        # only robots exchange messages
+        if isinstance(agent, RobotBase):
+            self.message_bus.register(agent)
+            self.active_robots.add(agent)
+        elif isinstance(agent, Box):
+            self.metrics.add_box()
+
+    def deregister_agent(self, agent):
+        super().deregister_agent(agent)
+        if isinstance(agent, RobotBase):
+            self.message_bus.unregister(agent)
+            self.active_robots.discard(agent)
+        elif isinstance(agent, Box):
+            self.metrics.remove_box()
 
     def get_robots(self):
         """Helper method to get all robot agents"""
@@ -46,22 +161,42 @@ class CoCaRoModel(mesa.Model):
 
     def initialize_nests(self):
         nest_num = 3
-        nest_locations = [self.grid[(15, 15)], self.grid[(35, 15)], self.grid[(25, 32)]]
+        width, height = self.grid.dimensions
+        nest_cells = [self.grid[(int(fx * width), int(fy * height))] for fx, fy in self.nest_locations]
         shuffled_colors = self.random.sample(self.colors, len(self.colors))
 
-        Nest.create_agents(
+        nests = Nest.create_agents(
             self,
             nest_num,
             color=shuffled_colors,
-            cell=nest_locations,
+            cell=nest_cells,
         )
+        self.index_nests(nests)
+
+    def index_nests(self, nests):
+        # nests never move: precompute color -> nest and a Manhattan distance field per color
+        self.nest_by_color = {}
+        for nest in nests:
+            self.nest_by_color.setdefault(nest.color, nest)
+            self.navigation.pin(nest.cell)
+
+        self.color_index = {color: i for i, color in enumerate(self.colors)}
+        xs, ys = np.indices(self.grid.dimensions)
+        self.nest_distance_fields = np.zeros((len(self.colors), *self.grid.dimensions), dtype=np.int32)
+        for color, nest in self.nest_by_color.items():
+            nest_x, nest_y = nest.cell.coordinate
+            self.nest_distance_fields[self.color_index[color]] = np.abs(xs - nest_x) + np.abs(ys - nest_y)
+
+    def nest_distance(self, color, coordinate):
+        """Manhattan distance from coordinate to the nest of the given color"""
+        return int(self.nest_distance_fields[self.color_index[color]][coordinate])
 
     def initialize_boxes(self):
         Box.create_agents(
             self,
             self.box_num,
             color=self.random.choices(self.colors, k=self.box_num),
-            cell=self.random.choices(self.grid.all_cells.cells, k=self.box_num),
+            cell=self.random.choices(self.passable_cells(), k=self.box_num),
         )
 
 
@@ -77,23 +212,24 @@ class CoCaRoModel(mesa.Model):
         remaining = self.robot_num - len(color_list)
         color_list += self.random.choices(self.colors, k=remaining)
 
-        # Map robot types to classes
-        robot_classes = {
-            "RANDOM": RobotRandom,
-            "GREEDY": RobotGreedy,
-            "COOPERATIVE": RobotCooperative,
-            "SAPHESIA": RobotSaphesia
-        }
         # Get the robot class based on type
-        robot_class = robot_classes.get(self.robot_type)
+        robot_class = self.robot_classes.get(self.robot_type)
 
         robot_class.create_agents(
             self,
             self.robot_num,
             color=color_list,
-            cell=self.random.choices(self.grid.all_cells.cells, k=self.robot_num),
+            cell=self.random.choices(self.passable_cells(), k=self.robot_num),
         )
 
+    def passable_cells(self):
+        """Cells not blocked, in grid order"""
+        cells = self.grid.all_cells.cells
+        blocked = self.navigation.blocked
+        if not blocked.any():
+            return cells
+        return [cell for cell in cells if not blocked[cell.coordinate]]
+
 
     def get_agents_by_color(self, color):
         return [agnt for agnt in self.agents if agnt.color == color]
@@ -106,31 +242,65 @@ class CoCaRoModel(mesa.Model):
             print(f"  {color}: {count} agents")
 
     def step(self):
-        print(f"=== Model Step {self.steps} | {len(self.agents)} agents ===")
-        self.agents.shuffle_do("step")
+        if self.event_log.info:
+            self.event_log.emit(EventLog.INFO, "model_step", agents=len(self.agents))
+        # RL robots choose their boxes together, before anyone moves
+        if self.q_learning.robots:
+            self.q_learning.step()
+        if self.activation == "active":
+            self.active_robots.shuffle_do("step")
+        else:
+            self.agents.shuffle_do("step")
+        # SAPHESIA systems ask each other for help from their robots' batteries after the move
+        if self.component_systems.robot_count:
+            self.component_systems.step()
+        # messages sent during this step are read by their recipients next step
+        self.message_bus.deliver()
 
-        # Spawn boxes every 3 steps (after step 0)
-        if self.steps > 0 and self.steps % self.box_spawn_interval == 0:
+        for _ in range(self._boxes_due()):
             self._spawn_new_box()
 
-        self.data_collector.collect(self)
+        if self.steps % self.collect_interval == 0:
+            self.data_collector.collect(self)
+
+    def _boxes_due(self):
+        """Number of boxes to spawn at this step"""
+        if self.box_spawn_rate is not None:
+            return int(self.rng.poisson(self.box_spawn_rate))
+        # Spawn boxes every box_spawn_interval steps (after step 0)
+        if self.steps > 0 and self.steps % self.box_spawn_interval == 0:
+            return self.boxes_per_spawn
+        return 0
 
     def _spawn_new_box(self):
-        """Spawn new box at random location with random color"""
-        empty_cells = [cell for cell in self.grid.all_cells if cell.is_empty]
-        if empty_cells:
-            new_box = Box(
-                self,
-                color=self.random.choice(self.colors),
-                cell=self.random.choice(empty_cells)
-            )
+        """Spawn new box at random empty location with random color"""
+        if not self.free_cells:
+            return
+        new_box = Box(
+            self,
+            color=self.random.choice(self.colors),
+            cell=self._pick_spawn_cell()
+        )
+
+    def _pick_spawn_cell(self, attempts=8):
+        """Random empty cell, near a random hotspot if any are configured"""
+        if self.box_hotspots:
+            hotspot_x, hotspot_y = self.random.choice(self.box_hotspots)
+            radius = self.hotspot_radius
+            for _ in range(attempts):
+                x = hotspot_x + self.random.randint(-radius, radius)
+                y = hotspot_y + self.random.randint(-radius, radius)
+                if 0 <= x < self.grid.width and 0 <= y < self.grid.height and self.grid[(x, y)] in self.free_cells:
+                    return self.grid[(x, y)]
+        # no hotspot, or the hotspot area is crowded
+        return self.free_cells.sample(self.random)
 
 
 
 
 # Test it
 if __name__ == "__main__":
-    model = CoCaRoModel("random", robot_num=2, box_num=3, width=3, height=3)
+    model = CoCaRoModel("GREEDY", robot_num=9, box_num=30, seed=42)
 
 
     print("=== Initial State ===")
@@ -142,4 +312,4 @@ if __name__ == "__main__":
     print("\n=== Step 2 ===")
     model.step()
 
-    model.print_agent_summary()
\ No newline at end of file
+    model.print_agent_summary()
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+#  ===== NEXT-HOP TABLE =====
+class NextHops:
+    """Distance field toward one target cell, and the next hops derived from it
+
+    Next hops are filled in lazily, per cell, the first time a robot stands
+    there: robots only ever walk a thin band of the grid toward a target.
+    """
+
+    def __init__(self, distances):
+        self.distances = distances  # (width, height) steps to the target, -1 where unreachable
+        self.hops = {}              # cell -> neighbors one step closer to the target
+
+
+#  ===== NAVIGATOR =====
+class Navigator:
+    """Shortest-path moves over the grid, avoiding blocked cells
+
+    On a grid without obstacles the next hops only depend on the cell and the
+    direction of the target (the neighbors that reduce the Manhattan
+    distance), so a single (cell, direction) table serves every target.
+    Once cells are blocked, each target gets a breadth-first distance field
+    over the passable cells: pinned targets (the nests) keep theirs for the
+    whole run, other targets (boxes) share an LRU cache of cache_size tables.
+    Either way next hops come in the grid's neighborhood order.
+
+    Blocked cells are also taken out of free_cells (a FreeCells), if given,
+    so that no box spawns where robots cannot go.
+    """
+
+    def __init__(self, grid, cache_size=128, free_cells=None):
+        self.grid = grid
+        self.cache_size = cache_size
+        self.free_cells = free_cells
+        self.blocked = np.zeros(grid.dimensions, dtype=bool)
+        self._open = not grid.torus  # no blocked cells: direction table
+        self._direction_hops = {}   # (cell, step_x, step_y) -> neighbors one step closer
+        self._pinned = {}           # target cell -> NextHops, never evicted
+        self._cache = OrderedDict()  # target cell -> NextHops, least recently used first
+        self._neighbors = {}        # cell -> passable neighbors, in neighborhood order
+        # cache statistics
+        self.table_hits = 0
+        self.table_misses = 0
+        self.hop_hits = 0
+        self.hop_misses = 0
+        self.evictions = 0
+
+    def pin(self, target):
+        """Precompute the table toward target and keep it for the whole run"""
+        self._pinned[target] = NextHops(self._distance_field(target))
+
+    def block(self, cells):
+        """Mark cells as obstacles: robots no longer enter or path through them"""
+        self._set_blocked(cells, True)
+
+    def unblock(self, cells):
+        self._set_blocked(cells, False)
+
+    def _set_blocked(self, cells, blocked):
+        for cell in cells:
+            self.blocked[cell.coordinate] = blocked
+            if self.free_cells is not None:
+                if blocked:
+                    self.free_cells.block(cell)
+                else:
+                    self.free_cells.unblock(cell)
+        self._open = not self.grid.torus and not self.blocked.any()
+        # every table may have changed
+        self._cache.clear()
+        self._neighbors.clear()
+        self._direction_hops.clear()
+        for target in self._pinned:
+            self.pin(target)
+
+    def is_blocked(self, cell):
+        return bool(self.blocked[cell.coordinate])
+
+    def neighbors(self, cell):
+        """Passable neighbors of cell, in the grid's neighborhood order"""
+        neighbors = self._neighbors.get(cell)
+        if neighbors is None:
+            neighbors = tuple(neighbor for neighbor in cell.neighborhood if not self.blocked[neighbor.coordinate])
+            self._neighbors[cell] = neighbors
+        return neighbors
+
+    def next_hops(self, cell, target):
+        """Neighbors of cell one step closer to target, empty if target is unreachable"""
+        if self._open:
+            return self._next_hops_open(cell, target)
+        table = self._table(target)
+        hops = table.hops.get(cell)
+        if hops is not None:
+            self.hop_hits += 1
+            return hops
+
+        self.hop_misses += 1
+        distances = table.distances
+        reachable = [(neighbor, distances[neighbor.coordinate]) for neighbor in self.neighbors(cell)
+                     if distances[neighbor.coordinate] >= 0]
+        if reachable:
+            min_distance = min(distance for _, distance in reachable)
+            hops = tuple(neighbor for neighbor, distance in reachable if distance == min_distance)
+        else:
+            hops = ()
+        table.hops[cell] = hops
+        return hops
+
+    def _next_hops_open(self, cell, target):
+        (x, y), (target_x, target_y) = cell.coordinate, target.coordinate
+        step_x = (target_x > x) - (target_x < x)
+        step_y = (target_y > y) - (target_y < y)
+        key = (cell, step_x, step_y)
+        hops = self._direction_hops.get(key)
+        if hops is not None:
+            self.hop_hits += 1
+            return hops
+
+        self.hop_misses += 1
+        hops = tuple(
+            neighbor for neighbor in self.neighbors(cell)
+            if (step_x and neighbor.coordinate[0] - x == step_x) or (step_y and neighbor.coordinate[1] - y == step_y)
+        )
+        self._direction_hops[key] = hops
+        return hops
+
+    def distance(self, cell, target):
+        """Steps from cell to target along passable cells, -1 if unreachable"""
+        return int(self._table(target).distances[cell.coordinate])
+
+    def _table(self, target):
+        table = self._pinned.get(target)
+        if table is not None:
+            self.table_hits += 1
+            return table
+        table = self._cache.get(target)
+        if table is not None:
+            self.table_hits += 1
+            self._cache.move_to_end(target)
+            return table
+
+        self.table_misses += 1
+        table = NextHops(self._distance_field(target))
+        self._cache[target] = table
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return table
+
+    def _distance_field(self, target):
+        """Breadth-first distance from every cell to target, -1 where unreachable"""
+        target_x, target_y = target.coordinate
+        if self._open:
+            # nothing in the way: plain Manhattan distance
+            xs, ys = np.indices(self.grid.dimensions)
+            return (np.abs(xs - target_x) + np.abs(ys - target_y)).astype(np.int32)
+
+        passable = ~self.blocked
+        distances = np.full(self.grid.dimensions, -1, dtype=np.int32)
+        if not passable[target_x, target_y]:
+            return distances
+        frontier = np.zeros(self.grid.dimensions, dtype=bool)
+        frontier[target_x, target_y] = True
+        distances[target_x, target_y] = 0
+        distance = 0
+        while frontier.any():
+            distance += 1
+            frontier = self._expand(frontier) & passable & (distances < 0)
+            distances[frontier] = distance
+        return distances
+
+    def _expand(self, frontier):
+        """Cells orthogonally adjacent to the frontier"""
+        if self.grid.torus:
+            return (np.roll(frontier, 1, axis=0) | np.roll(frontier, -1, axis=0)
+                    | np.roll(frontier, 1, axis=1) | np.roll(frontier, -1, axis=1))
+        expanded = np.zeros_like(frontier)
+        expanded[1:, :] |= frontier[:-1, :]
+        expanded[:-1, :] |= frontier[1:, :]
+        expanded[:, 1:] |= frontier[:, :-1]
+        expanded[:, :-1] |= frontier[:, 1:]
+        return expanded
+
+    def stats(self):
+        """Cache counters and hit rates of the distance tables and next-hop lookups"""
+        tables = self.table_hits + self.table_misses
+        hops = self.hop_hits + self.hop_misses
+        return {
+            "table_hits": self.table_hits,
+            "table_misses": self.table_misses,
+            "table_hit_rate": self.table_hits / tables if tables else 0.0,
+            "hop_hits": self.hop_hits,
+            "hop_misses": self.hop_misses,
+            "hop_hit_rate": self.hop_hits / hops if hops else 0.0,
+            "evictions": self.evictions,
+            "cached_tables": len(self._cache),
+            "direction_entries": len(self._direction_hops),
+            "pinned_tables": len(self._pinned),
+        }
@@ -0,0 +1,211 @@
+"""Opt-in wall-time profiling of CoCaRoModel steps, phase by phase.
+
+Profiler wraps the step phases of the robot classes (RobotBase.step and
+what it calls, the cooperative message readers) and the model-level passes
+(RL batch, component systems, message delivery, box spawning, data
+collection) for the duration of a with block, and puts them back on exit.
+Nothing is wrapped outside the block, so unprofiled runs pay nothing.
+
+Every call is recorded under its call stack, e.g.
+
+    CoCaRoModel.step;COOPERATIVE.step;COOPERATIVE.search_box
+
+robot frames being named after the robot type of the instance, so classes
+sharing a method (every robot type inherits RobotBase.search_box) are kept
+apart. A method calling its super() version counts once. Results come as a
+per-phase table (calls, total and self time) or as folded stacks of self
+microseconds, the input format of flamegraph.pl, speedscope and inferno.
+
+Phase methods are wrapped on their classes, so robots of any model stepped
+in the block are profiled; only the step of the profiled model is wrapped
+on the instance, Mesa binding it when the model is built. The block must
+run in one thread.
+
+Example:
+    with model.profile() as profiler:
+        for _ in range(100):
+            model.step()
+    print(profiler.table(steps=100))
+    profiler.write_folded("cooperative.folded")
+"""
+import csv
+import time
+from collections import defaultdict
+
+from mesa.datacollection import DataCollector
+
+from agents.robot_base import RobotBase
+from component_system import ComponentSystems
+from message_bus import MessageBus
+from rl import QLearning
+
+# robot methods timed, in the order a robot step runs them
+ROBOT_PHASES = ("step", "read_requests", "read_agrees", "read_refuses", "read_informs",
+                "update_battery", "update_reachable_boxes", "wander", "search_box", "update_carried_box_position",
+                "go_to_target_box", "take_box", "carry_box_to_nest", "drop_box_in_nest", "die")
+# methods of the model class timed, its step is wrapped on the model itself
+MODEL_PHASES = ("_spawn_new_box",)
+# other model-level passes timed
+PASSES = ((QLearning, "step"), (ComponentSystems, "step"), (MessageBus, "deliver"), (DataCollector, "collect"))
+
+
+#  ===== PROFILER =====
+class Profiler:
+    """Call counts and wall time per call stack of the phases of model and its robot classes"""
+
+    def __init__(self, model, robot_classes=None):
+        if robot_classes is None:
+            robot_classes = model.robot_classes
+        self.model = model
+        self.model_class = type(model)
+        # robot class -> robot type, e.g. RobotCooperative -> COOPERATIVE
+        self.robot_types = {robot_class: robot_type for robot_type, robot_class in robot_classes.items()}
+        # call stack -> [calls, total seconds, seconds spent in profiled callees]
+        self.stats = defaultdict(lambda: [0, 0.0, 0.0])
+        self._stack = []
+        self._patches = []
+
+    def __enter__(self):
+        targets = [(owner, name, None) for owner in (self.model_class,) for name in MODEL_PHASES]
+        targets += [(owner, name, None) for owner, name in PASSES]
+        # the robot classes and their robot bases, each wrapping the phases it defines itself
+        robot_owners = {base for robot_class in self.robot_types for base in robot_class.__mro__
+                        if issubclass(base, RobotBase)}
+        targets += [(owner, name, self._robot_label) for owner in robot_owners for name in ROBOT_PHASES
+                    if name in owner.__dict__]
+        for owner, name, label in targets:
+            original = owner.__dict__.get(name)
+            self._patches.append((owner, name, original))
+            setattr(owner, name, self._profiled(label or f"{owner.__name__}.{name}", getattr(owner, name)))
+        # Mesa set model.step to its step wrapper, bound to the model's own step
+        self.model.step = self._profiled(f"{self.model_class.__name__}.step", self.model.step)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.model.step = self.model.step.__wrapped__
+        for owner, name, original in reversed(self._patches):
+            if original is None:  # the method was inherited
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._patches = []
+        self._stack.clear()
+
+    def _robot_label(self, robot, name):
+        robot_class = type(robot)
+        return f"{self.robot_types.get(robot_class, robot_class.__name__)}.{name}"
+
+    def _profiled(self, label, method):
+        stack = self._stack
+        stats = self.stats
+        clock = time.perf_counter
+        name = method.__name__
+
+        def profiled(*args, **kwargs):
+            frame = label(args[0], name) if callable(label) else label
+            if stack and stack[-1] == frame:  # super() call of the same phase
+                return method(*args, **kwargs)
+            stack.append(frame)
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                entry = stats[tuple(stack)]
+                entry[0] += 1
+                entry[1] += elapsed
+                stack.pop()
+                if stack:
+                    stats[tuple(stack)][2] += elapsed
+        profiled.__wrapped__ = method
+        return profiled
+
+    # ----- results -----
+    def phases(self):
+        """Per-phase totals over every call stack, as rows sorted by self time
+
+        Each row holds owner (robot type or class), phase, calls, total_s
+        and self_s. Phases reached through several stacks add up; a phase
+        calling itself through other frames would count twice in total_s,
+        never in self_s.
+        """
+        totals = defaultdict(lambda: [0, 0.0, 0.0])
+        for stack, (calls, total, children) in self.stats.items():
+            entry = totals[stack[-1]]
+            entry[0] += calls
+            entry[1] += total
+            entry[2] += total - children
+        rows = []
+        for frame, (calls, total, self_time) in totals.items():
+            owner, phase = frame.rsplit(".", 1)
+            rows.append({"owner": owner, "phase": phase, "calls": calls, "total_s": total, "self_s": self_time})
+        rows.sort(key=lambda row: -row["self_s"])
+        return rows
+
+    def total_time(self):
+        """Seconds spent in outermost profiled calls"""
+        return sum(total for stack, (_, total, _) in self.stats.items() if len(stack) == 1)
+
+    def table(self, steps=None):
+        """The phases() rows as aligned text, with ms per step when steps is given"""
+        grand_total = self.total_time() or 1.0
+        per = f"{'ms/step':>9}" if steps else ""
+        lines = [f"{'owner':16} {'phase':28} {'calls':>10} {'total ms':>10} {'self ms':>10} {'self %':>7}{per}"]
+        for row in self.phases():
+            line = (f"{row['owner']:16} {row['phase']:28} {row['calls']:10d} {1000 * row['total_s']:10.1f} "
+                    f"{1000 * row['self_s']:10.1f} {row['self_s'] / grand_total:7.1%}")
+            if steps:
+                line += f"{1000 * row['self_s'] / steps:9.3f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def write_table(self, path):
+        """Write the phases() rows to a CSV file"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["owner", "phase", "calls", "total_s", "self_s"])
+            writer.writeheader()
+            writer.writerows(self.phases())
+
+    def folded(self):
+        """Folded stacks: one 'frame;frame;frame self_microseconds' line per call stack"""
+        lines = []
+        for stack, (_, total, children) in sorted(self.stats.items()):
+            self_us = round(1e6 * (total - children))
+            if self_us > 0:
+                lines.append(f"{';'.join(stack)} {self_us}")
+        return lines
+
+    def write_folded(self, path):
+        """Write folded() to a file, e.g. for flamegraph.pl path > flamegraph.svg"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.folded()) + "\n")
+
+
+# Test it
+if __name__ == "__main__":
+    from model import CoCaRoModel
+
+    STEPS = 100
+    owners = {robot_class for robot_class in CoCaRoModel.robot_classes.values()} | {RobotBase, CoCaRoModel}
+    methods = {owner: dict(owner.__dict__) for owner in owners}
+    for robot_type in ("GREEDY", "COOPERATIVE"):
+        model = CoCaRoModel(robot_type, robot_num=90, box_num=18, seed=42)
+        with model.profile() as profiler:
+            start = time.perf_counter()
+            for _ in range(STEPS):
+                model.step()
+            elapsed = time.perf_counter() - start
+        print(f"=== {robot_type}: {1000 * elapsed / STEPS:.2f} ms/step profiled ===")
+        print(profiler.table(steps=STEPS))
+        rows = {(row["owner"], row["phase"]): row for row in profiler.phases()}
+        assert rows[("CoCaRoModel", "step")]["calls"] == STEPS
+        assert rows[(robot_type, "step")]["calls"] == STEPS * 90
+        # self times add up to the profiled time, which the steps took
+        assert abs(sum(row["self_s"] for row in rows.values()) - profiler.total_time()) < 1e-6
+        assert profiler.total_time() <= elapsed
+        assert all(line.startswith("CoCaRoModel.step") for line in profiler.folded())
+        print()
+
+    # every method is put back once the block exits
+    assert all(dict(owner.__dict__) == before for owner, before in methods.items())
+    print("OK")
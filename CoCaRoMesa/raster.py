@@ -0,0 +1,163 @@
+"""Raster view of a CoCaRo grid: one RGB image per step, built with NumPy.
+
+Every cell gets the code of the top-most thing on it, robots over dead
+robots over boxes over nests:
+
+    0                      empty
+    1 + c                  nest of color index c
+    1 + n + c              box of color index c
+    1 + 2n                 dead robot
+    2 + 2n + c             robot of color index c
+
+where n is the number of colors. Codes grow with the layer, so downsampling
+a block of cells to one pixel keeps the block's highest code, and a lone
+robot stays visible on a 500x500 grid shown at 100x100.
+
+Works on CoCaRoModel and ArrayCoCaRoModel alike.
+"""
+import numpy as np
+
+from agents.box import Box
+from agents.nest import Nest
+from agents.robot_base import RobotBase
+from array_model import ArrayCoCaRoModel
+
+BACKGROUND = (255, 255, 255)
+DEAD_ROBOT = (127, 127, 127)
+# matplotlib tab: colors, as agent_portrayal uses
+ROBOT_COLORS = {"red": (214, 39, 40), "green": (44, 160, 44), "blue": (31, 119, 180)}
+BOX_SHADE = 0.35    # boxes are their color mixed with that much white
+NEST_SHADE = 0.75
+
+
+def _mix(color, shade):
+    return tuple(round(c + (255 - c) * shade) for c in color)
+
+
+def palette(colors):
+    """(codes, 3) uint8 RGB table of the cell codes, for a model's color list"""
+    robot = [ROBOT_COLORS[color] for color in colors]
+    return np.array([BACKGROUND,
+                     *(_mix(c, NEST_SHADE) for c in robot),
+                     *(_mix(c, BOX_SHADE) for c in robot),
+                     DEAD_ROBOT,
+                     *robot], dtype=np.uint8)
+
+
+#  ===== MODEL STATE =====
+def agent_positions(model):
+    """x, y and color index arrays of the nests, boxes and robots (color -1 for dead robots)"""
+    if isinstance(model, ArrayCoCaRoModel):
+        boxes = np.flatnonzero(model.box_alive[:model.box_total])
+        nests = np.arange(len(model.colors))
+        return ((model.nest_x, model.nest_y, nests),
+                (model.box_x[boxes], model.box_y[boxes], model.box_color[boxes]),
+                (model.x, model.y, model.color))
+
+    color_index = model.color_index
+    nests, boxes, robots = [], [], []
+    for agent_class, agents in model.agents_by_type.items():
+        if issubclass(agent_class, RobotBase):
+            layer = robots
+        elif issubclass(agent_class, Box):
+            layer = boxes
+        elif issubclass(agent_class, Nest):
+            layer = nests
+        else:
+            continue
+        layer.extend((*agent.cell.coordinate, color_index.get(agent.color, -1)) for agent in agents)
+    return tuple(_columns(layer) for layer in (nests, boxes, robots))
+
+
+def _columns(rows):
+    array = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return array[:, 0], array[:, 1], array[:, 2]
+
+
+def cell_codes(model):
+    """(width, height) array of the code of each cell"""
+    n = len(model.colors)
+    width, height = grid_size(model)
+    codes = np.zeros((width, height), dtype=np.uint8)
+    (nest_x, nest_y, nest_color), (box_x, box_y, box_color), (robot_x, robot_y, robot_color) = agent_positions(model)
+    codes[nest_x, nest_y] = 1 + nest_color
+    # several agents on a cell: np.maximum.at keeps the highest code
+    np.maximum.at(codes, (box_x, box_y), (1 + n + box_color).astype(np.uint8))
+    np.maximum.at(codes, (robot_x, robot_y), np.where(robot_color < 0, 1 + 2 * n, 2 + 2 * n + robot_color)
+                  .astype(np.uint8))
+    return codes
+
+
+def grid_size(model):
+    if isinstance(model, ArrayCoCaRoModel):
+        return model.width, model.height
+    return model.grid.dimensions
+
+
+def downsample(codes, factor):
+    """Highest code of each factor x factor block; edge blocks may be smaller"""
+    if factor <= 1:
+        return codes
+    width, height = codes.shape
+    padded = np.zeros((-(-width // factor) * factor, -(-height // factor) * factor), dtype=codes.dtype)
+    padded[:width, :height] = codes
+    blocks = padded.reshape(padded.shape[0] // factor, factor, padded.shape[1] // factor, factor)
+    return blocks.max(axis=(1, 3))
+
+
+def raster(model, max_pixels=None):
+    """(rows, columns, 3) uint8 image of the grid, y growing upwards
+
+    With max_pixels, grids wider or higher than that are downsampled by the
+    smallest integer factor that fits them.
+    """
+    codes = cell_codes(model)
+    if max_pixels:
+        codes = downsample(codes, -(-max(codes.shape) // max_pixels))
+    # rows are y, top row is the highest y, as the scatter space view
+    return palette(model.colors)[codes.T[::-1]]
+
+
+# Test it
+if __name__ == "__main__":
+    import time
+
+    from model import CoCaRoModel
+
+    # every agent shows on its cell with the color of its top layer
+    model = CoCaRoModel("COOPERATIVE", robot_num=90, box_num=18, seed=1)
+    for _ in range(1000):
+        model.step()
+    codes = cell_codes(model)
+    n = len(model.colors)
+    expected = {}
+    for agent in model.agents:
+        if isinstance(agent, RobotBase):
+            code = 1 + 2 * n if agent.color == "gray" else 2 + 2 * n + model.color_index[agent.color]
+        elif isinstance(agent, Box):
+            code = 1 + n + model.color_index[agent.color]
+        else:
+            code = 1 + model.color_index[agent.color]
+        expected[agent.cell.coordinate] = max(code, expected.get(agent.cell.coordinate, 0))
+    assert all(codes[coordinate] == code for coordinate, code in expected.items())
+    assert np.count_nonzero(codes) == len(expected)
+    image = raster(model)
+    assert image.shape == (50, 50, 3) and image.dtype == np.uint8
+
+    # downsampled blocks keep the top layer of their cells
+    blocks = downsample(codes, 4)
+    assert blocks.shape == (13, 13)
+    assert blocks[0, 0] == codes[:4, :4].max() and blocks[12, 12] == codes[48:, 48:].max()
+    assert raster(model, max_pixels=25).shape == (25, 25, 3)
+    print("OK")
+
+    print("\n=== Raster time, 500x500 grid ===")
+    for model in (CoCaRoModel("GREEDY", robot_num=10000, box_num=2000, width=500, height=500, seed=1),
+                  ArrayCoCaRoModel("GREEDY", robot_num=10000, box_num=2000, width=500, height=500, seed=1)):
+        for max_pixels in (None, 250, 100):
+            start = time.perf_counter()
+            for _ in range(10):
+                image = raster(model, max_pixels)
+            elapsed = (time.perf_counter() - start) / 10
+            print(f"{type(model).__name__:17} max_pixels={str(max_pixels):4} {image.shape[1]}x{image.shape[0]} px "
+                  f"{1000 * elapsed:6.1f} ms")
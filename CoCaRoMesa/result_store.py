@@ -0,0 +1,255 @@
+"""Append-only columnar store for per-run time series, shared by the Mesa and GAMA sides.
+
+Layout (hive-style partitions, one directory per robot type and run):
+
+    <root>/_schema.json
+    <root>/robot_type=<type>/run_id=<id>/part-00000.arrow   (pyarrow backend, Arrow IPC)
+    <root>/robot_type=<type>/run_id=<id>/part-00000/        (numpy backend, one .npy per column + meta.json)
+
+Appending to a run adds a new part, existing parts are never rewritten. Parts
+are written under a temporary name and renamed into place, so readers and
+resumed sweeps only ever see complete parts. Reads are memory-mapped and only
+touch the requested columns of the requested runs.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # pure-NumPy fallback
+    pa = None
+
+
+SCHEMA_VERSION = 1
+# column -> dtype, shared by every run in the store
+SCHEMA = {
+    "step": "int64",            # model step (Mesa) or cycle (GAMA)
+    "mean_battery": "float64",
+    "box_count": "int64",
+    "alive_robots": "int64",
+    "messages": "int64",        # cooperative messages delivered at that step, -1 when not recorded
+}
+# rows of a GAMA export read at a time by import_gama_csv
+GAMA_CHUNK_ROWS = 100_000
+# Mesa DataCollector reporter -> store column
+MESA_COLUMNS = {
+    "Step": "step",
+    "MeanBatteryLevel": "mean_battery",
+    "BoxCount": "box_count",
+    "AliveRobots": "alive_robots",
+    "Messages": "messages",
+}
+
+
+class ResultStore:
+    def __init__(self, root, backend=None):
+        """backend is "arrow" or "numpy", defaults to arrow when pyarrow is installed"""
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        schema_path = os.path.join(root, "_schema.json")
+        if os.path.exists(schema_path):
+            with open(schema_path, encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored["columns"] != SCHEMA:
+                raise ValueError(f"{root} was written with a different schema: {stored['columns']}")
+            self.backend = stored["backend"]
+        else:
+            self.backend = backend or ("arrow" if pa is not None else "numpy")
+            with open(schema_path, "w", encoding="utf-8") as f:
+                json.dump({"version": SCHEMA_VERSION, "backend": self.backend, "columns": SCHEMA}, f, indent=2)
+        if self.backend == "arrow" and pa is None:
+            raise ImportError(f"{root} uses the arrow backend, install pyarrow to read it")
+
+    # ----- writing -----
+    def append(self, robot_type, run_id, columns, metadata=None):
+        """Append one part to a run; columns maps every SCHEMA column to a 1-d array"""
+        missing = set(SCHEMA) - set(columns)
+        if missing:
+            raise ValueError(f"missing columns: {sorted(missing)}")
+        arrays = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in SCHEMA.items()}
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) != 1:
+            raise ValueError("all columns must have the same length")
+
+        run_dir = self._run_dir(robot_type, run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        part = f"part-{len(self._parts(run_dir)):05d}"
+        meta = {"robot_type": robot_type, "run_id": run_id, **(metadata or {})}
+        if self.backend == "arrow":
+            self._write_arrow(os.path.join(run_dir, part + ".arrow"), arrays, meta)
+        else:
+            self._write_numpy(os.path.join(run_dir, part), arrays, meta)
+
+    def remove_run(self, robot_type, run_id):
+        """Delete every part of a run, e.g. before writing it again"""
+        run_dir = self._run_dir(robot_type, run_id)
+        if not os.path.isdir(run_dir):
+            return
+        # out of the store's layout first, so readers never see half a run
+        tmp_dir = run_dir + ".removed"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.replace(run_dir, tmp_dir)
+        shutil.rmtree(tmp_dir)
+
+    def append_model_vars(self, robot_type, run_id, df, metadata=None):
+        """Append a Mesa DataCollector model-vars DataFrame"""
+        columns = {column: df[reporter].to_numpy() for reporter, column in MESA_COLUMNS.items()}
+        self.append(robot_type, run_id, columns, metadata)
+
+    @staticmethod
+    def _write_arrow(path, arrays, meta):
+        table = pa.table(arrays).replace_schema_metadata({"cocaro": json.dumps(meta)})
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _write_numpy(path, arrays, meta):
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, name + ".npy"), array)
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    # ----- reading -----
+    def runs(self, robot_types=None):
+        """(robot_type, run_id) of every run with at least one complete part"""
+        found = []
+        for type_dir in sorted(os.listdir(self.root)):
+            if not type_dir.startswith("robot_type="):
+                continue
+            robot_type = type_dir.split("=", 1)[1]
+            if robot_types is not None and robot_type not in robot_types:
+                continue
+            for run_dir in sorted(os.listdir(os.path.join(self.root, type_dir))):
+                if run_dir.startswith("run_id=") and self._parts(os.path.join(self.root, type_dir, run_dir)):
+                    found.append((robot_type, run_dir.split("=", 1)[1]))
+        return found
+
+    def has_run(self, robot_type, run_id):
+        run_dir = self._run_dir(robot_type, run_id)
+        return os.path.isdir(run_dir) and bool(self._parts(run_dir))
+
+    def metadata(self, robot_type, run_id):
+        """Metadata of the first part of a run"""
+        run_dir = self._run_dir(robot_type, run_id)
+        part_path = os.path.join(run_dir, self._parts(run_dir)[0])
+        if part_path.endswith(".arrow"):
+            with pa.memory_map(part_path) as source:
+                schema = pa.ipc.open_file(source).schema
+            return json.loads(schema.metadata[b"cocaro"])
+        with open(os.path.join(part_path, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def iter_runs(self, columns=None, robot_types=None, run_ids=None):
+        """Yield (robot_type, run_id, {column: array}) one run at a time
+
+        Arrays are memory-mapped and read-only when a run has a single part.
+        """
+        columns = list(columns or SCHEMA)
+        for robot_type, run_id in self.runs(robot_types):
+            if run_ids is not None and run_id not in run_ids:
+                continue
+            run_dir = self._run_dir(robot_type, run_id)
+            parts = [self._read_part(os.path.join(run_dir, part), columns) for part in self._parts(run_dir)]
+            if len(parts) == 1:
+                yield robot_type, run_id, parts[0]
+            else:
+                yield robot_type, run_id, {name: np.concatenate([part[name] for part in parts]) for name in columns}
+
+    def read_frame(self, columns=None, robot_types=None, run_ids=None):
+        """Load the selected columns and runs into one pandas DataFrame"""
+        import pandas as pd
+
+        frames = [
+            pd.DataFrame(arrays).assign(robot_type=robot_type, run_id=run_id)
+            for robot_type, run_id, arrays in self.iter_runs(columns, robot_types, run_ids)
+        ]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(columns or SCHEMA))
+
+    @staticmethod
+    def _read_part(path, columns):
+        if path.endswith(".arrow"):
+            # the arrays keep the mapping alive once the file is closed
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all().select(columns)
+            return {name: table.column(name).to_numpy() for name in columns}
+        return {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in columns}
+
+    def _run_dir(self, robot_type, run_id):
+        return os.path.join(self.root, f"robot_type={robot_type}", f"run_id={run_id}")
+
+    @staticmethod
+    def _parts(run_dir):
+        return sorted(name for name in os.listdir(run_dir) if name.startswith("part-") and not name.endswith(".tmp"))
+
+
+def import_gama_csv(csv_path, store, seed=None, chunksize=GAMA_CHUNK_ROWS):
+    """Load a headerless GAMA export into store, return the run ids written
+
+    Rows are [cycle, mean_battery, box_count, alive_robots, robot_type(, seed)].
+    Files are appended to across experiments, so a new run starts whenever the
+    robot type, the seed or a decreasing cycle says so.
+
+    The file is read chunksize rows at a time and only the rows of the run
+    being read are kept, so memory does not grow with the file. Runs already
+    in the store are skipped without building their columns.
+    """
+    import pandas as pd
+
+    run_ids = []
+    run_index = 0
+    run = None          # (robot_type, run_id, seed) of the run being read
+    pieces = None       # its rows so far, None when it is already in the store
+    previous = None     # (robot_type, seed, step) of the last row of the previous chunk
+
+    def flush():
+        if pieces:
+            rows = pd.concat(pieces, ignore_index=True)
+            columns = {name: rows[name].to_numpy() for name in ("step", "mean_battery", "box_count", "alive_robots")}
+            columns["messages"] = np.full(len(rows), -1)
+            store.append(run[0], run[1], columns,
+                         {"source": "gama", "csv": os.path.basename(csv_path), "seed": run[2]})
+
+    for df in pd.read_csv(csv_path, header=None, chunksize=chunksize):
+        df.columns = ["step", "mean_battery", "box_count", "alive_robots", "robot_type", "seed"][:len(df.columns)]
+        if "seed" not in df:
+            df["seed"] = -1 if seed is None else seed
+
+        new_run = (
+            (df["robot_type"] != df["robot_type"].shift())
+            | (df["seed"] != df["seed"].shift())
+            | (df["step"] < df["step"].shift())
+        ).to_numpy(copy=True)
+        if previous is not None:  # the first row may continue the last run of the previous chunk
+            first = df.iloc[0]
+            new_run[0] = (first["robot_type"], first["seed"]) != previous[:2] or first["step"] < previous[2]
+        last = df.iloc[-1]
+        previous = (last["robot_type"], last["seed"], last["step"])
+
+        starts = np.flatnonzero(new_run).tolist()
+        for start, stop in zip([0] + starts, starts + [len(df)]):
+            if start == stop:
+                continue
+            if new_run[start]:
+                flush()
+                run_index += 1
+                robot_type = str(df["robot_type"].iat[start]).upper()
+                run_seed = int(df["seed"].iat[start])
+                run_id = (f"gama_{robot_type}_{run_index}" if run_seed < 0
+                          else f"gama_{robot_type}_s{run_seed}_{run_index}")
+                run = (robot_type, run_id, run_seed)
+                pieces = None if store.has_run(robot_type, run_id) else []
+                run_ids.append(run_id)
+            if pieces is not None:
+                pieces.append(df.iloc[start:stop])
+    flush()
+    return run_ids
@@ -0,0 +1,371 @@
+"""Batched linear Q-learning for RL robots, ported from CoCaRoGama/robot_rl.gaml.
+
+The GAMA robot keeps its weights in a map keyed "w_<feature>_<action>" and
+counts competitors for a box by looping over every robot's reachable boxes.
+Here the weights are a NumPy (features x actions) matrix, shared by all robots
+or one per robot, and feature extraction, Q estimates, TD updates and box
+selection run once per model step for all RL robots together. Actions, state
+features and reward shaping are those of robot_rl.gaml; distances are
+Manhattan, as everywhere else in the Mesa port.
+
+With shared weights the TD updates of one step are computed from the same
+weights and summed.
+"""
+import numpy as np
+
+
+# state features: battery, criticality, carrying, reachable boxes, then the targeted box's
+# distance, anticipated criticality, color match, availability and competitors
+FEATURE_NUM = 9
+# box-selection actions
+BEST_CRITICALITY, NEAREST, BEST_COLOR, BALANCED = range(4)
+ACTION_NUM = 4
+# move actions of externally controlled robots (ACTION_NUM + k): one cell north, south, west or east
+MOVES = ((0, 1), (0, -1), (-1, 0), (1, 0))
+
+
+#  ===== Q-LEARNING =====
+class QLearning:
+    def __init__(self, model, shared_weights=False, weights=None, epsilon=0.3, learning_rate=0.1,
+                 discount_factor=0.9, min_epsilon=0.05, epsilon_decay=0.9995, external=False):
+        self.model = model
+        # external: the model step leaves the robots alone, a controller calls observe() and act()
+        self.external = external
+        self.shared_weights = shared_weights
+        # (features, actions), or (robots, features, actions) per robot; random in [-0.1, 0.1] if None
+        self.initial_weights = weights
+        self.initial_epsilon = epsilon
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.min_epsilon = min_epsilon
+        self.epsilon_decay = epsilon_decay
+
+        self.robots = []
+        self.weights = None
+        # one row per registered robot
+        self.epsilon = np.zeros(0)
+        self.previous_features = np.zeros((0, FEATURE_NUM))
+        self.has_previous = np.zeros(0, dtype=bool)
+        self.previous_action = np.zeros(0, dtype=np.int64)  # -1 until the robot first chose a box
+        # robot -> cell it steps to instead of wandering, queued by move actions
+        self.pending_moves = {}
+        # learning progress
+        self.total_reward = 0.0
+        self.updates = 0
+
+    def register(self, robot):
+        """Add an RL robot, return its row in the learner's arrays"""
+        self.robots.append(robot)
+        return len(self.robots) - 1
+
+    def _grow(self):
+        """Allocate rows for the robots registered since the last step"""
+        old, new = len(self.epsilon), len(self.robots)
+        if old == new:
+            return
+        added = new - old
+        self.epsilon = np.concatenate([self.epsilon, np.full(added, self.initial_epsilon)])
+        self.previous_features = np.concatenate([self.previous_features, np.zeros((added, FEATURE_NUM))])
+        self.has_previous = np.concatenate([self.has_previous, np.zeros(added, dtype=bool)])
+        self.previous_action = np.concatenate([self.previous_action, np.full(added, -1, dtype=np.int64)])
+
+        initial = None if self.initial_weights is None else np.asarray(self.initial_weights, dtype=np.float64)
+        if self.shared_weights:
+            if self.weights is None:
+                self.weights = (initial.copy() if initial is not None
+                                else self.model.rng.uniform(-0.1, 0.1, (FEATURE_NUM, ACTION_NUM)))
+            return
+        if initial is None:
+            weights = self.model.rng.uniform(-0.1, 0.1, (added, FEATURE_NUM, ACTION_NUM))
+        elif initial.ndim == 2:
+            weights = np.repeat(initial[None], added, axis=0)
+        else:
+            weights = initial[old:new].copy()
+        self.weights = weights if self.weights is None else np.concatenate([self.weights, weights])
+
+    def q_values(self, features, rows):
+        """Q estimates of every action, for the robots at rows in the given states"""
+        if self.shared_weights:
+            return features @ self.weights
+        return np.einsum("nf,nfa->na", features, self.weights[rows])
+
+    def step(self):
+        """Observe, learn, then choose or switch boxes, for every alive RL robot"""
+        if self.external:
+            return  # actions come from outside, see vec_env
+        observation = self.observe()
+        if observation is None:
+            return
+        self.learn(observation)
+        self.act(observation, self._epsilon_greedy(observation))
+
+    def observe(self):
+        """Vision, state features and shaped reward of every alive RL robot, None if all are dead"""
+        self._grow()
+        robots = [robot for robot in self.robots if robot.battery > robot.min_battery]
+        if not robots:
+            return None
+        model = self.model
+        robot_class = type(robots[0])
+        n = len(robots)
+        rows = np.array([robot.rl_index for robot in robots])
+
+        # vision, and how many robots see each box
+        pair_robots, pair_boxes, competitors = [], [], {}
+        for i, robot in enumerate(robots):
+            robot.update_criticality()
+            robot.reachable_boxes = model.box_index.boxes_within(robot.cell, robot.vision_range)
+            pair_robots.extend([i] * len(robot.reachable_boxes))
+            pair_boxes.extend(robot.reachable_boxes)
+            for box in robot.reachable_boxes:
+                competitors[box] = competitors.get(box, 0) + 1
+        pair_robots = np.array(pair_robots, dtype=np.int64)
+        reach_counts = np.bincount(pair_robots, minlength=n)
+
+        state = _RobotState(model, robots)
+        targets = [robot.targeted_box for robot in robots]
+        carried = [robot.carried_box for robot in robots]
+        has_target = np.array([box is not None for box in targets])
+        carrying = np.array([box is not None for box in carried])
+
+        # ----- state features -----
+        features = np.zeros((n, FEATURE_NUM))
+        features[:, 0] = state.battery / robot_class.max_battery
+        features[:, 1] = np.array([robot.criticality for robot in robots]) / robot_class.max_criticality
+        features[:, 2] = carrying
+        features[:, 3] = np.minimum(1.0, reach_counts / 10.0)
+        targeting = np.flatnonzero(has_target)
+        if len(targeting):
+            boxes = [targets[i] for i in targeting]
+            criticality, distance, same_color = state.criticalities(targeting, boxes)
+            features[targeting, 4] = distance / 100.0  # Assuming max distance ~100
+            features[targeting, 5] = criticality / robot_class.max_criticality
+            features[targeting, 6] = same_color
+            features[targeting, 7] = [box.owner is None for box in boxes]
+            features[targeting, 8] = np.minimum(1.0, np.array([competitors.get(box, 0) for box in boxes]) / 5.0)
+
+        # ----- reward shaping -----
+        reward = np.zeros(n)
+        picked_up = np.flatnonzero(carrying & self.has_previous[rows] & (self.previous_features[rows, 2] == 0.0))
+        if len(picked_up):
+            criticality, _, same_color = state.criticalities(picked_up, [carried[i] for i in picked_up])
+            efficiency = 1.0 - criticality / robot_class.max_criticality  # lower criticality is better
+            reward[picked_up] += np.where(same_color, 10.0, 3.0) + efficiency * 5.0
+        reward[state.battery < robot_class.max_battery * 0.2] -= 2.0
+        free = ~has_target & ~carrying
+        idle = free & (reach_counts > 0)
+        reward[idle] -= 0.1  # time without progress
+        self.total_reward += float(reward.sum())
+
+        return Observation(robots, rows, features, reward, free, idle, state, reach_counts, pair_robots, pair_boxes)
+
+    def learn(self, observation):
+        """TD update of the action each robot took on its previous box choice"""
+        rows, features, reward = observation.rows, observation.features, observation.reward
+        learning = np.flatnonzero(self.has_previous[rows] & (self.previous_action[rows] >= 0))
+        if not len(learning):
+            return
+        learning_rows = rows[learning]
+        actions = self.previous_action[learning_rows]
+        previous = self.previous_features[learning_rows]
+        old_q = self.q_values(previous, learning_rows)[np.arange(len(learning)), actions]
+        max_q = self.q_values(features[learning], learning_rows).max(axis=1)
+        td_error = reward[learning] + self.discount_factor * max_q - old_q
+        delta = self.learning_rate * td_error[:, None] * previous
+        if self.shared_weights:
+            self.weights += delta.T @ np.eye(ACTION_NUM)[actions]
+        else:
+            self.weights[learning_rows, :, actions] += delta
+        self.updates += len(learning)
+
+    def _epsilon_greedy(self, observation):
+        """Epsilon-greedy box-selection action of the idle robots, -1 for the others"""
+        actions = np.full(len(observation.robots), -1)
+        deciding = np.flatnonzero(observation.idle)
+        if not len(deciding):
+            return actions
+        rng = self.model.rng
+        deciding_rows = observation.rows[deciding]
+        actions[deciding] = np.argmax(self.q_values(observation.features[deciding], deciding_rows), axis=1)
+        explore = rng.random(len(deciding)) < self.epsilon[deciding_rows]
+        actions[deciding[explore]] = rng.integers(0, ACTION_NUM, int(explore.sum()))
+        return actions
+
+    def act(self, observation, actions):
+        """Apply one action per observed robot, then switch boxes and remember the state
+
+        actions[i] is -1 (no decision), a box-selection action, taken by robots
+        seeing a box and neither targeting nor carrying one, or ACTION_NUM + k
+        to move free robots one cell along MOVES[k] instead of wandering.
+        """
+        robots, rows = observation.robots, observation.rows
+        actions = np.asarray(actions, dtype=np.int64)
+        self.pending_moves.clear()
+        moving = np.flatnonzero(observation.free & (actions >= ACTION_NUM))
+        if len(moving):
+            self._queue_moves([robots[i] for i in moving], actions[moving] - ACTION_NUM)
+
+        if len(observation.pair_robots):
+            box_actions = np.where(observation.idle & (actions < ACTION_NUM), actions, -1)
+            criticality, distance, same_color = observation.pair_criticalities()
+            self._choose_boxes(robots, rows, box_actions, observation.pair_robots, observation.pair_boxes,
+                               criticality, distance, same_color, type(robots[0]).max_criticality)
+            self._switch_boxes(robots, observation.state, observation.reach_counts, observation.pair_robots,
+                               observation.pair_boxes, criticality)
+
+        self.previous_features[rows] = observation.features
+        self.has_previous[rows] = True
+        self.epsilon[rows] = np.maximum(self.min_epsilon, self.epsilon[rows] * self.epsilon_decay)
+
+    def _queue_moves(self, robots, moves):
+        """Cells robots step to on their next wander, staying put against the border or a blocked cell"""
+        grid, navigation = self.model.grid, self.model.navigation
+        width, height = grid.dimensions
+        for robot, move in zip(robots, moves):
+            step_x, step_y = MOVES[move]
+            x, y = robot.cell.coordinate
+            x, y = x + step_x, y + step_y
+            if grid.torus:
+                x, y = x % width, y % height
+            if 0 <= x < width and 0 <= y < height and not navigation.blocked[x, y]:
+                self.pending_moves[robot] = grid[(x, y)]
+
+    def _choose_boxes(self, robots, rows, robot_actions, pair_robots, pair_boxes,
+                      criticality, distance, same_color, max_criticality):
+        """Box selected by each robot's action, for robots with an action (>= 0)"""
+        deciding = np.flatnonzero(robot_actions >= 0)
+        if not len(deciding):
+            return
+        pair_actions = robot_actions[pair_robots]
+        has_match = np.bincount(pair_robots[same_color], minlength=len(robots)) > 0
+        scores = np.choose(np.maximum(pair_actions, 0), [
+            criticality,                                                     # BEST_CRITICALITY
+            distance,                                                        # NEAREST
+            np.where(has_match[pair_robots],                                 # BEST_COLOR, nearest match, or
+                     np.where(same_color, distance, np.inf), criticality),   # best criticality without one
+            criticality / max_criticality + distance / 50.0 - 0.3 * same_color,  # BALANCED
+        ])
+        selected = _first_min(pair_robots, scores, pair_actions >= 0)
+
+        log = self.model.event_log
+        for i in self.model.rng.permutation(deciding):
+            box = pair_boxes[selected[i]] if selected[i] >= 0 else None
+            if box is not None and box.owner is None:
+                robot = robots[i]
+                robot.targeted_box = box
+                box.owner = robot
+                self.previous_action[rows[i]] = robot_actions[i]
+                if log.debug:
+                    log.emit(log.DEBUG, "target_box", robot, box=box.unique_id, action=int(robot_actions[i]))
+
+    def _switch_boxes(self, robots, state, reach_counts, pair_robots, pair_boxes, criticality):
+        """Drop the current box for a free reachable one at least 30% less critical"""
+        focus = [robot.carried_box if robot.carried_box is not None else robot.targeted_box for robot in robots]
+        focused = np.array([i for i, box in enumerate(focus) if box is not None and reach_counts[i]], dtype=np.int64)
+        if not len(focused):
+            return
+        current, _, _ = state.criticalities(focused, [focus[i] for i in focused])
+        available = np.array([box.owner is None for box in pair_boxes])
+        best = _first_min(pair_robots, criticality, available)
+
+        for j in self.model.rng.permutation(len(focused)):
+            i = focused[j]
+            if best[i] < 0 or not criticality[best[i]] < current[j] * 0.7:  # 30% improvement threshold
+                continue
+            box = pair_boxes[best[i]]
+            if box.owner is not None:  # taken by a robot that switched earlier in this batch
+                continue
+            robot = robots[i]
+            if robot.carried_box is not None:
+                robot.carried_box.owner = None
+                robot.carried_box = None
+            else:
+                robot.targeted_box.owner = None
+                robot.targeted_box = None
+            robot.targeted_box = box
+            box.owner = robot
+
+
+class Observation:
+    """What the alive RL robots saw at the start of a model step, and the rewards they got"""
+
+    def __init__(self, robots, rows, features, reward, free, idle, state, reach_counts, pair_robots, pair_boxes):
+        self.robots = robots              # alive RL robots
+        self.rows = rows                  # their rows in the learner's arrays
+        self.features = features          # (robots, FEATURE_NUM) state features
+        self.reward = reward              # shaped reward of the last step
+        self.free = free                  # neither targeting nor carrying a box
+        self.idle = idle                  # free, with boxes in sight
+        self.state = state
+        self.reach_counts = reach_counts  # boxes in sight per robot
+        # (robot index, box) pairs of every box a robot sees
+        self.pair_robots = pair_robots
+        self.pair_boxes = pair_boxes
+        self._pair_criticalities = None
+
+    def pair_criticalities(self):
+        """Anticipated criticality, distance and color match of every (robot, box in sight) pair"""
+        if self._pair_criticalities is None:
+            self._pair_criticalities = self.state.criticalities(self.pair_robots, self.pair_boxes)
+        return self._pair_criticalities
+
+
+class _RobotState:
+    """Positions, batteries and colors of a batch of robots, for vectorized criticalities"""
+
+    def __init__(self, model, robots):
+        self.model = model
+        self.robot_class = type(robots[0])
+        self.coords = np.array([robot.cell.coordinate for robot in robots], dtype=np.int64).reshape(-1, 2)
+        self.battery = np.array([robot.battery for robot in robots], dtype=np.float64)
+        self.colors = np.array([model.color_index.get(robot.color, -1) for robot in robots], dtype=np.int64)
+
+    def criticalities(self, robot_indices, boxes):
+        """Anticipated criticality, distance and color match of (robot_indices[k], boxes[k]) pairs"""
+        model = self.model
+        box_coords = np.array([box.cell.coordinate for box in boxes], dtype=np.int64).reshape(-1, 2)
+        box_colors = np.array([model.color_index[box.color] for box in boxes], dtype=np.int64)
+        robot_coords = self.coords[robot_indices]
+        distance = np.abs(box_coords - robot_coords).sum(axis=1)
+        dist_box_to_nest = model.nest_distance_fields[box_colors, box_coords[:, 0], box_coords[:, 1]]
+        same_color = box_colors == self.colors[robot_indices]
+        criticality = self.robot_class.anticipated_criticality(
+            self.battery[robot_indices], distance, dist_box_to_nest, same_color)
+        return criticality, distance, same_color
+
+
+def _first_min(groups, scores, mask):
+    """Per group, index of the first masked element with the lowest score, -1 if none"""
+    result = np.full(int(groups.max()) + 1 if len(groups) else 0, -1, dtype=np.int64)
+    candidates = np.flatnonzero(mask)
+    if not len(candidates):
+        return result
+    order = candidates[np.lexsort((candidates, scores[candidates], groups[candidates]))]
+    _, first = np.unique(groups[order], return_index=True)
+    result[groups[order[first]]] = order[first]
+    return result
+
+
+# Train it
+if __name__ == "__main__":
+    import time
+
+    from model import CoCaRoModel
+
+    # shared weights and exploration rate carried over from one episode to the next
+    weights, epsilon = None, 0.3
+    start = time.perf_counter()
+    episodes = 30
+    for episode in range(1, episodes + 1):
+        model = CoCaRoModel("RL", robot_num=90, box_num=18, seed=episode, collect_interval=300,
+                            rl_params=dict(shared_weights=True, weights=weights, epsilon=epsilon))
+        for _ in range(300):
+            model.step()
+        learner = model.q_learning
+        weights, epsilon = learner.weights, float(learner.epsilon.mean())
+        if episode % 5 == 0:
+            print(f"episode {episode}: reward {learner.total_reward:8.1f}, boxes left {model.metrics.box_count:3}, "
+                  f"mean battery {model.metrics.mean_battery:6.1f}, epsilon {epsilon:.3f}")
+    print(f"{(time.perf_counter() - start) / episodes:.2f}s per 300-step episode")
+    print("weights (features x actions):")
+    print(np.round(weights, 3))
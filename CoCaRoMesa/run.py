@@ -1 +1,159 @@
-# could contain the code to run the model.
\ No newline at end of file
+"""Headless CoCaRoModel runs: no visualization imports, metrics written to disk.
+
+Example:
+    python run.py --robot-type GREEDY --robots 90 --boxes 18 --steps 1000 --seed 42 --output greedy.csv
+    python run.py --engine arrays --robots 10000 --boxes 2000 --width 500 --height 500 --steps 500
+    python run.py --robot-type COOPERATIVE --steps 200 --profile cooperative
+"""
+import contextlib
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from array_model import ArrayCoCaRoModel
+from model import CoCaRoModel
+from result_store import ResultStore
+
+
+ROBOT_TYPES = ["RANDOM", "GREEDY", "COOPERATIVE", "SAPHESIA", "RL"]
+# one agent object per robot, or struct-of-arrays (RANDOM and GREEDY only)
+ENGINES = {"agents": CoCaRoModel, "arrays": ArrayCoCaRoModel}
+
+
+def run_model(steps, engine="agents", profile=False, **model_params):
+    """Build a CoCaRoModel, run it for steps steps and return (model, elapsed seconds)
+
+    With profile, the steps run inside model.profile() and model.profiler
+    holds the phase timings.
+    """
+    model = ENGINES[engine](**model_params)
+    with model.profile() if profile else contextlib.nullcontext():
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        elapsed = time.perf_counter() - start
+    model.event_log.close()
+    return model, elapsed
+
+
+def run_id(params, steps, collect_interval=1):
+    """Run id of a parameter set and run length, also the run partition name in a ResultStore
+
+    Runs of other lengths or collect intervals get other ids, so a store
+    never mistakes a shorter run for the one asked for. Unseeded runs cannot
+    be repeated, each call gives them a new id.
+    """
+    seed = params["seed"]
+    seed_part = f"s{seed}" if seed is not None else f"u{uuid.uuid4().hex[:12]}"
+    rid = (f"{params['robot_type']}_r{params['robot_num']}_b{params['box_num']}"
+           f"_{params['width']}x{params['height']}_{seed_part}_t{steps}_c{collect_interval}")
+    engine = params.get("engine", "agents")
+    return rid if engine == "agents" else f"{rid}_{engine}"
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB (traced Python memory without `resource`)"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, in kilobytes on Linux
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    return tracemalloc.get_traced_memory()[1] / 2**20
+
+
+def write_metrics(model, path):
+    """Write the model-level DataCollector series to a CSV file"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    df = model.data_collector.get_model_vars_dataframe()
+    df.to_csv(path, index=False)
+    return df
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run CoCaRoModel without visualization")
+    parser.add_argument("--robot-type", default="GREEDY", choices=ROBOT_TYPES)
+    parser.add_argument("--engine", default="agents", choices=list(ENGINES))
+    parser.add_argument("--robots", type=int, default=90, help="number of robots")
+    parser.add_argument("--boxes", type=int, default=18, help="number of initial boxes")
+    parser.add_argument("--width", type=int, default=50)
+    parser.add_argument("--height", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--collect-interval", type=int, default=1, help="collect metrics every N steps")
+    parser.add_argument("--output", default="metrics.csv", help="CSV file for the collected metrics")
+    parser.add_argument("--store", default=None, help="also write the metrics to the ResultStore in this directory")
+    parser.add_argument("--replace", action="store_true",
+                        help="overwrite a run already in --store with the same id, instead of refusing")
+    parser.add_argument("--log-level", default="off", choices=["debug", "info", "warning", "off"])
+    parser.add_argument("--log-path", default=None, help="event log file (.jsonl or binary), stdout if omitted")
+    parser.add_argument("--profile", default=None, metavar="PREFIX",
+                        help="time the step phases, writing PREFIX.csv and PREFIX.folded (flame graph input)")
+    args = parser.parse_args(argv)
+    if args.profile and args.engine != "agents":
+        parser.error("--profile times agent methods, it needs --engine agents")
+    if args.engine == "arrays" and args.robot_type not in ArrayCoCaRoModel.ROBOT_TYPES:
+        parser.error(f"--engine arrays supports {', '.join(ArrayCoCaRoModel.ROBOT_TYPES)}, not {args.robot_type}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if resource is None:
+        tracemalloc.start()
+
+    params = dict(
+        robot_type=args.robot_type,
+        robot_num=args.robots,
+        box_num=args.boxes,
+        width=args.width,
+        height=args.height,
+        seed=args.seed,
+        engine=args.engine,
+    )
+    rid = run_id(params, args.steps, args.collect_interval)
+    store = ResultStore(args.store) if args.store else None
+    if store is not None and store.has_run(args.robot_type, rid) and not args.replace:
+        sys.exit(f"run {rid} is already in {args.store}, pass --replace to overwrite it")
+    model, elapsed = run_model(
+        args.steps,
+        **params,
+        collect_interval=args.collect_interval,
+        log_level=args.log_level,
+        log_path=args.log_path,
+        profile=bool(args.profile),
+    )
+    df = write_metrics(model, args.output)
+    if store is not None:
+        # a run id is one run: never add its metrics to another run's parts
+        store.remove_run(args.robot_type, rid)
+        metadata = {**params, "steps": args.steps, "collect_interval": args.collect_interval, "elapsed": elapsed}
+        store.append_model_vars(args.robot_type, rid, df, metadata)
+
+    print(f"{args.robot_type}: {args.steps} steps in {elapsed:.2f}s "
+          f"({args.steps / elapsed if elapsed else float('inf'):.1f} steps/sec)")
+    print(f"peak memory: {peak_memory_mb():.1f} MB")
+    if hasattr(model, "navigation"):  # the array engine moves robots without it
+        nav = model.navigation.stats()
+        print(f"navigation cache: {nav['hop_hit_rate']:.1%} next-hop hits, "
+              f"{nav['table_hit_rate']:.1%} table hits, {nav['evictions']} evictions")
+    if args.profile:
+        print(model.profiler.table(steps=args.steps))
+        model.profiler.write_table(f"{args.profile}.csv")
+        model.profiler.write_folded(f"{args.profile}.folded")
+        print(f"phase timings written to {args.profile}.csv and {args.profile}.folded")
+    if not df.empty:
+        print(f"final metrics: {df.iloc[-1].to_dict()}")
+    print(f"metrics written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""Array-backed snapshots of CoCaRoModel runs, to save, restore and fork them.
+
+A snapshot holds the whole state of a model between two steps as NumPy
+arrays plus a small JSON header: agents in activation order with their cells,
+colors, box ownership and robot state, the box-index and free-cell orders,
+blocked cells, cooperative messages, Q-learning arrays, run counters,
+collected data and the state of both random generators. Nothing is pickled,
+so loading a snapshot never runs code, and nothing is deep-copied: forks
+rebuild their agents from the same read-only arrays.
+
+A model restored from a snapshot continues exactly like the original would
+have, step for step. It may also resume with other parameters, e.g. another
+robot type for what-if experiments, robots then keeping their cell, color,
+battery and boxes. Building the grid is most of the cost of a restore, so
+rollouts from a shared prefix can pass the grid of a finished rollout
+(CoCaRoModel.from_snapshot(snapshot, grid=old.grid)).
+
+Example:
+    model.snapshot().save("step500.npz")
+    snapshot = ModelSnapshot.load("step500.npz")
+    greedy = CoCaRoModel.from_snapshot(snapshot)
+    cooperative = CoCaRoModel.from_snapshot(snapshot, robot_type="COOPERATIVE")
+"""
+import itertools
+import json
+
+import numpy as np
+from mesa import Agent
+
+from agents.box import Box
+from agents.nest import Nest
+from agents.robot_base import RobotBase
+from message_bus import Message
+
+# agent kinds
+NEST, BOX, ROBOT = range(3)
+# kinds of message content items
+STRING, INT, FLOAT, AGENT = range(4)
+
+
+#  ===== MODEL SNAPSHOT =====
+class ModelSnapshot:
+    def __init__(self, header, arrays):
+        self.header = header  # JSON-compatible parameters, counters and random generator states
+        self.arrays = arrays  # name -> read-only NumPy array
+        for array in arrays.values():
+            array.setflags(write=False)
+
+    @property
+    def params(self):
+        """CoCaRoModel keyword arguments of the snapshot's run"""
+        return self.header["params"]
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def save(self, path):
+        """Write the snapshot to an uncompressed .npz file"""
+        np.savez(path, header=np.array(json.dumps(self.header, default=int)), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data["header"]))
+            arrays = {name: data[name] for name in data.files if name != "header"}
+        return cls(header, arrays)
+
+    #  ----- taking a snapshot -----
+    @classmethod
+    def take(cls, model):
+        """Snapshot of model, between two steps"""
+        agents = list(model.agents)  # activation order
+        boxes = [agent for agent in agents if isinstance(agent, Box)]
+        robots = [agent for agent in agents if isinstance(agent, RobotBase)]
+        color_index = model.color_index  # other colors (dead robots' gray) are -1
+        arrays = {
+            "agent_kind": np.array([NEST if isinstance(agent, Nest) else BOX if isinstance(agent, Box) else ROBOT
+                                    for agent in agents], dtype=np.int8),
+            "agent_id": _ids(agents),
+            "agent_cell": _coordinates(agent.cell for agent in agents),
+            "agent_color": np.array([color_index.get(agent.color, -1) for agent in agents], dtype=np.int8),
+            "box_owner": _ids(box.owner for box in boxes),
+            "box_holder_counts": np.array([len(box.holders) for box in boxes], dtype=np.int64),
+            "box_holders": _ids(holder for box in boxes for holder in box.holders),
+            "box_index_order": _ids(model.box_index),
+            "robot_vision_range": np.array([robot.vision_range for robot in robots], dtype=np.int64),
+            "robot_targeted_box": _ids(robot.targeted_box for robot in robots),
+            "robot_carried_box": _ids(robot.carried_box for robot in robots),
+            "robot_target_nest": _ids(robot.target_nest for robot in robots),
+            "robot_previous_cell": _coordinates(robot.previous_cell for robot in robots),
+            "robot_battery": np.array([robot.battery for robot in robots], dtype=np.int64),
+            "robot_criticality": np.array([robot.criticality for robot in robots], dtype=np.int64),
+            "free_cells": _coordinates(model.free_cells),
+            "blocked": model.navigation.blocked.copy(),
+        }
+        # reachable boxes are not kept: every robot refreshes them before using them
+        if robots and hasattr(robots[0], "inboxes"):
+            arrays["robot_box_reserved"] = np.array([robot.box_reserved for robot in robots])
+            arrays["robot_request_last_cycle"] = np.array(
+                [robot.is_request_criticality_last_cycle for robot in robots])
+        if robots and hasattr(robots[0], "system"):
+            # SAPHESIA robots keep their system when they die and turn gray
+            arrays["robot_system_color"] = np.array([color_index.get(robot.system.color, -1) for robot in robots],
+                                                    dtype=np.int8)
+
+        # messages read next step, then messages waiting for delivery (none between steps)
+        messages = [(robot.unique_id, message.sender, code, message.content, True)
+                    for robot in robots if hasattr(robot, "inboxes")
+                    for code, inbox in enumerate(robot.inboxes) for message in inbox]
+        messages += [(to_id, sender, code, content, False)
+                     for to_id, sender, code, content in model.message_bus.pending()]
+        strings, ghost_boxes = {}, {}
+        item_kinds, item_values = [], []
+        for _, _, _, content, _ in messages:
+            for item in content:
+                kind, value = _encode(item, strings)
+                item_kinds.append(kind)
+                item_values.append(value)
+                if kind == AGENT and item.cell is None:  # delivered box, still referenced by a message
+                    ghost_boxes[item.unique_id] = color_index[item.color]
+        arrays.update({
+            "message_recipient": np.array([message[0] for message in messages], dtype=np.int64),
+            "message_sender": np.array([message[1] for message in messages], dtype=np.int64),
+            "message_performative": np.array([message[2] for message in messages], dtype=np.int8),
+            "message_delivered": np.array([message[4] for message in messages], dtype=bool),
+            "message_item_counts": np.array([len(message[3]) for message in messages], dtype=np.int64),
+            "message_item_kind": np.array(item_kinds, dtype=np.int8),
+            "message_item_value": np.array(item_values, dtype=np.float64),
+            "ghost_box_id": np.array(list(ghost_boxes), dtype=np.int64),
+            "ghost_box_color": np.array(list(ghost_boxes.values()), dtype=np.int8),
+            "bus_step_counts": np.array(model.message_bus.step_counts, dtype=np.int64),
+        })
+
+        learner = model.q_learning
+        if learner.robots and learner.weights is not None:
+            arrays.update({
+                "rl_weights": learner.weights.copy(),
+                "rl_epsilon": learner.epsilon.copy(),
+                "rl_previous_features": learner.previous_features.copy(),
+                "rl_has_previous": learner.has_previous.copy(),
+                "rl_previous_action": learner.previous_action.copy(),
+            })
+        for name, values in model.data_collector.model_vars.items():
+            arrays[f"collected_{name}"] = np.array(values)
+
+        # Mesa hands out unique ids from a per-model counter: read the next one and put it back
+        next_id = next(Agent._ids[model])
+        Agent._ids[model] = itertools.count(next_id)
+        random_version, random_state, random_gauss = model.random.getstate()
+        arrays["random_state"] = np.array(random_state, dtype=np.int64)
+        header = {
+            "params": _model_params(model),
+            "steps": model.steps,
+            "running": model.running,
+            "next_id": next_id,
+            "random_version": random_version,
+            "random_gauss": random_gauss,
+            "rng_state": model.rng.bit_generator.state,
+            "metrics": dict(vars(model.metrics)),
+            "bus_dropped": model.message_bus.dropped,
+            "rl_total_reward": learner.total_reward,
+            "rl_updates": learner.updates,
+            "strings": list(strings),
+            "component_systems": [
+                {"color": system.color, "is_helping": system.is_helping,
+                 "helped_colors": sorted(system.helped_colors), "requests": list(system.requests)}
+                for system in model.component_systems
+            ],
+        }
+        return cls(header, arrays)
+
+    #  ----- restoring it -----
+    def restore(self, model):
+        """Rebuild the snapshot's state into model, a CoCaRoModel created without agents"""
+        arrays, header = self.arrays, self.header
+        grid = model.grid
+        colors = model.colors + ["gray"]  # color index -1
+        robot_class = model.robot_classes[model.robot_type]
+
+        # agents, in activation order and with their ids
+        agents_by_id, nests, boxes, robots = {}, [], [], []
+        vision_ranges = iter(arrays["robot_vision_range"].tolist())
+        system_colors = iter(arrays["robot_system_color"].tolist() if "robot_system_color" in arrays else [])
+        for kind, unique_id, coordinate, color in zip(arrays["agent_kind"].tolist(), arrays["agent_id"].tolist(),
+                                                      arrays["agent_cell"].tolist(),
+                                                      arrays["agent_color"].tolist()):
+            Agent._ids[model] = itertools.count(unique_id)
+            cell = grid[tuple(coordinate)]
+            if kind == NEST:
+                agent = Nest(model, colors[color], cell)
+                nests.append(agent)
+            elif kind == BOX:
+                agent = Box(model, colors[color], cell)
+                boxes.append(agent)
+            else:
+                # built with its system's color, if any, then given its current one
+                agent = robot_class(model, colors[next(system_colors, color)], cell, next(vision_ranges))
+                agent.color = colors[color]
+                robots.append(agent)
+            agents_by_id[unique_id] = agent
+        for unique_id, color in zip(arrays["ghost_box_id"].tolist(), arrays["ghost_box_color"].tolist()):
+            Agent._ids[model] = itertools.count(unique_id)
+            agent = Box(model, colors[color], grid.all_cells.cells[0])
+            agent.remove()
+            agents_by_id[unique_id] = agent
+        Agent._ids[model] = itertools.count(header["next_id"])
+        model.index_nests(nests)
+
+        # references between agents, set around the RobotBase setters: holders are restored as they were
+        holders = np.split(arrays["box_holders"], np.cumsum(arrays["box_holder_counts"])[:-1])
+        for box, owner, box_holders in zip(boxes, arrays["box_owner"].tolist(), holders):
+            box.owner = agents_by_id.get(owner)
+            box.holders = dict.fromkeys(agents_by_id[holder] for holder in box_holders.tolist())
+        for robot, targeted, carried, nest, (x, y), battery, criticality in zip(
+                robots, arrays["robot_targeted_box"].tolist(), arrays["robot_carried_box"].tolist(),
+                arrays["robot_target_nest"].tolist(), arrays["robot_previous_cell"].tolist(),
+                arrays["robot_battery"].tolist(), arrays["robot_criticality"].tolist()):
+            robot._targeted_box = agents_by_id.get(targeted)
+            robot._carried_box = agents_by_id.get(carried)
+            robot.target_nest = agents_by_id.get(nest)
+            robot.previous_cell = grid[(x, y)] if x >= 0 else None
+            robot._battery = battery
+            robot._criticality = criticality
+            if battery <= robot.min_battery:
+                model.active_robots.discard(robot)
+        if "robot_box_reserved" in arrays and hasattr(robot_class, "inboxes"):
+            for robot, reserved, last_cycle in zip(robots, arrays["robot_box_reserved"].tolist(),
+                                                   arrays["robot_request_last_cycle"].tolist()):
+                robot.box_reserved = reserved
+                robot.is_request_criticality_last_cycle = last_cycle
+
+        # messages
+        bus = model.message_bus
+        strings = header["strings"]
+        items = [_decode(kind, value, strings, agents_by_id) for kind, value in
+                 zip(arrays["message_item_kind"].tolist(), arrays["message_item_value"].tolist())]
+        starts = np.concatenate([[0], np.cumsum(arrays["message_item_counts"])]).tolist()
+        for recipient, sender, code, delivered, start, stop in zip(
+                arrays["message_recipient"].tolist(), arrays["message_sender"].tolist(),
+                arrays["message_performative"].tolist(), arrays["message_delivered"].tolist(),
+                starts[:-1], starts[1:]):
+            content = items[start:stop]
+            if not delivered:
+                bus.send(sender, recipient, code, content)
+            elif hasattr(agents_by_id[recipient], "inboxes"):
+                agents_by_id[recipient].inboxes[code].append(Message(sender, code, content))
+        bus.step_counts[:] = arrays["bus_step_counts"].tolist()
+        bus.dropped = header["bus_dropped"]
+
+        # index orders, which decide vision and spawn ties
+        model.box_index.reorder([agents_by_id[unique_id] for unique_id in arrays["box_index_order"].tolist()])
+        if arrays["blocked"].any():
+            model.navigation.block([grid[tuple(coordinate)] for coordinate in np.argwhere(arrays["blocked"]).tolist()])
+        model.free_cells.reorder([grid[tuple(coordinate)] for coordinate in arrays["free_cells"].tolist()])
+
+        learner = model.q_learning
+        if "rl_epsilon" in arrays and len(learner.robots) == len(arrays["rl_epsilon"]):
+            learner.weights = arrays["rl_weights"].copy()
+            learner.epsilon = arrays["rl_epsilon"].copy()
+            learner.previous_features = arrays["rl_previous_features"].copy()
+            learner.has_previous = arrays["rl_has_previous"].copy()
+            learner.previous_action = arrays["rl_previous_action"].copy()
+            learner.total_reward = header["rl_total_reward"]
+            learner.updates = header["rl_updates"]
+
+        systems = model.component_systems
+        if systems.robot_count:
+            systems.recount(robots)  # counted with the initial battery when the robots were built
+            for state in header["component_systems"]:
+                system = systems[state["color"]]
+                for color in state["helped_colors"]:
+                    system.help_system(systems[color])
+                system.is_helping = state["is_helping"]
+                system.requests = list(state["requests"])
+
+        vars(model.metrics).update(header["metrics"])
+        for name in model.data_collector.model_vars:
+            model.data_collector.model_vars[name] = arrays[f"collected_{name}"].tolist()
+        model.steps = header["steps"]
+        model.running = header["running"]
+        model.random.setstate((header["random_version"], tuple(arrays["random_state"].tolist()),
+                               header["random_gauss"]))
+        model.rng.bit_generator.state = header["rng_state"]
+
+
+def _model_params(model):
+    """CoCaRoModel keyword arguments to rebuild model, without its agents"""
+    learner = model.q_learning
+    return {
+        "robot_type": model.robot_type,
+        "robot_num": model.robot_num,
+        "box_num": model.box_num,
+        "width": model.grid.width,
+        "height": model.grid.height,
+        "seed": model._seed,
+        "collect_interval": model.collect_interval,
+        "box_spawn_interval": model.box_spawn_interval,
+        "boxes_per_spawn": model.boxes_per_spawn,
+        "box_spawn_rate": model.box_spawn_rate,
+        "box_hotspots": [list(hotspot) for hotspot in model.box_hotspots] or None,
+        "hotspot_radius": model.hotspot_radius,
+        "activation": model.activation,
+        "rl_params": {
+            "shared_weights": learner.shared_weights,
+            "epsilon": learner.initial_epsilon,
+            "learning_rate": learner.learning_rate,
+            "discount_factor": learner.discount_factor,
+            "min_epsilon": learner.min_epsilon,
+            "epsilon_decay": learner.epsilon_decay,
+            "external": learner.external,
+        },
+    }
+
+
+def _ids(agents):
+    return np.array([-1 if agent is None else agent.unique_id for agent in agents], dtype=np.int64)
+
+
+def _coordinates(cells):
+    """(n, 2) cell coordinates, (-1, -1) for None"""
+    return np.array([(-1, -1) if cell is None else cell.coordinate for cell in cells], dtype=np.int32).reshape(-1, 2)
+
+
+def _encode(item, strings):
+    """(kind, value) of a message content item; strings get an index in strings"""
+    if isinstance(item, str):
+        return STRING, strings.setdefault(item, len(strings))
+    if isinstance(item, Box):
+        return AGENT, item.unique_id
+    if isinstance(item, (int, np.integer)):
+        return INT, item
+    return FLOAT, item
+
+
+def _decode(kind, value, strings, agents_by_id):
+    if kind == STRING:
+        return strings[int(value)]
+    if kind == AGENT:
+        return agents_by_id[int(value)]
+    if kind == INT:
+        return int(value)
+    return value
+
+
+# Test it
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    from model import CoCaRoModel
+
+    def state(model):
+        """Everything observable of a run, to compare two runs"""
+        return ([(agent.unique_id, type(agent).__name__, agent.cell.coordinate, agent.color,
+                  getattr(agent, "battery", None)) for agent in model.agents],
+                model.data_collector.get_model_vars_dataframe().to_dict("list"),
+                model.random.random(), float(model.rng.random()))
+
+    # a restored model (saved, loaded or forked) continues exactly like the original
+    print("=== Restore check ===")
+    wall = [(x, 25) for x in range(5, 46)]  # blocked cells are restored, free cells without them
+    for robot_type in ("RANDOM", "GREEDY", "COOPERATIVE", "SAPHESIA", "RL"):
+        model = CoCaRoModel(robot_type, robot_num=60, box_num=20, seed=11, blocked_cells=wall)
+        for _ in range(300):
+            model.step()
+        snapshot = model.snapshot()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot.npz")
+            snapshot.save(path)
+            copies = [CoCaRoModel.from_snapshot(ModelSnapshot.load(path))] + model.fork(2)
+        for _ in range(150):
+            for m in [model] + copies:
+                m.step()
+        expected = state(model)
+        assert all(state(m) == expected for m in copies), robot_type
+        print(f"OK {robot_type}: {len(snapshot.arrays)} arrays, {snapshot.nbytes} bytes")
+
+    # what-if: same prefix, other robot types
+    print("\n=== Branching at step 150 ===")
+    model = CoCaRoModel("GREEDY", robot_num=90, box_num=18, seed=5)
+    for _ in range(150):
+        model.step()
+    snapshot = model.snapshot()
+    for robot_type in ("GREEDY", "COOPERATIVE", "RANDOM"):
+        branch = CoCaRoModel.from_snapshot(snapshot, robot_type=robot_type)
+        for _ in range(150):
+            branch.step()
+        print(f"{robot_type:12} boxes {branch.metrics.box_count:3}, mean battery {branch.metrics.mean_battery:6.1f}")
+
+    print("\n=== Timing, 90 robots ===")
+    repeats = 20
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.snapshot()
+    print(f"snapshot                {1000 * (time.perf_counter() - start) / repeats:6.2f} ms")
+    start = time.perf_counter()
+    model.fork(repeats)
+    print(f"fork                    {1000 * (time.perf_counter() - start) / repeats:6.2f} ms per copy")
+    # most of a fork is building the grid: rollouts can restore into the grid of a finished one
+    rollout = CoCaRoModel.from_snapshot(snapshot)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        rollout = CoCaRoModel.from_snapshot(snapshot, grid=rollout.grid)
+    print(f"restore, recycled grid  {1000 * (time.perf_counter() - start) / repeats:6.2f} ms")
@@ -0,0 +1,129 @@
+#  ===== BOX SPATIAL INDEX =====
+class BoxIndex:
+    """Box-only bucketed grid, kept up to date by Box.cell
+
+    Each bucket mirrors the box order of its cell, and cells are scanned in the
+    grid's own neighborhood order, so a vision query returns exactly the boxes,
+    in the same order, as filtering cell.get_neighborhood(radius).agents.
+    """
+
+    def __init__(self):
+        self._buckets = {}      # cell -> boxes in that cell, only non-empty cells
+        self._scan_orders = {}  # (cell, radius) -> cells within radius, in neighborhood order
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def __iter__(self):
+        """Boxes bucket after bucket, in bucket order"""
+        for bucket in self._buckets.values():
+            yield from bucket
+
+    def move(self, box, old_cell, new_cell):
+        """Mirror a Box.cell assignment: leave old_cell, append to new_cell"""
+        if old_cell is not None:
+            bucket = self._buckets[old_cell]
+            bucket.remove(box)
+            if not bucket:
+                del self._buckets[old_cell]
+        if new_cell is not None:
+            self._buckets.setdefault(new_cell, []).append(box)
+
+    def reorder(self, boxes):
+        """Rebuild the buckets with boxes listed bucket after bucket, in bucket order"""
+        self._buckets = {}
+        for box in boxes:
+            self._buckets.setdefault(box.cell, []).append(box)
+
+    def boxes_at(self, cell):
+        return list(self._buckets.get(cell, ()))
+
+    def boxes_within(self, cell, radius):
+        """Boxes within Manhattan radius of cell, the cell itself excluded"""
+        buckets = self._buckets
+        if not buckets:
+            return []
+
+        scan_order = self._scan_orders.get((cell, radius))
+        if scan_order is None:
+            scan_order = tuple(cell.get_neighborhood(radius=radius, include_center=False).cells)
+            self._scan_orders[(cell, radius)] = scan_order
+
+        boxes = []
+        for neighbor in scan_order:
+            bucket = buckets.get(neighbor)
+            if bucket:
+                boxes.extend(bucket)
+        return boxes
+
+
+#  ===== FREE CELLS =====
+class FreeCells:
+    """Cells without any agent, with O(1) updates and O(1) random sampling
+
+    Free cells live in an unordered array with a cell -> position map, so a
+    cell is removed by swapping the last one into its slot. Blocked cells
+    (see Navigator.block) are never free, even without agents.
+    """
+
+    def __init__(self, cells):
+        self._cells = list(cells)
+        self._positions = {cell: i for i, cell in enumerate(self._cells)}
+        self._counts = {}  # cell -> number of agents, only occupied cells
+        self._blocked = set()
+
+    def __len__(self):
+        return len(self._cells)
+
+    def __iter__(self):
+        """Free cells, in sampling order"""
+        return iter(self._cells)
+
+    def __contains__(self, cell):
+        return cell in self._positions
+
+    def move(self, old_cell, new_cell):
+        """Mirror an agent leaving old_cell and entering new_cell (either may be None)"""
+        if old_cell is not None:
+            count = self._counts[old_cell] - 1
+            if count:
+                self._counts[old_cell] = count
+            else:
+                del self._counts[old_cell]
+                if old_cell not in self._blocked:
+                    self._positions[old_cell] = len(self._cells)
+                    self._cells.append(old_cell)
+        if new_cell is not None:
+            count = self._counts.get(new_cell, 0)
+            if count == 0 and new_cell in self._positions:
+                self._discard(new_cell)
+            self._counts[new_cell] = count + 1
+
+    def block(self, cell):
+        """Take cell out of the free cells until it is unblocked"""
+        self._blocked.add(cell)
+        if cell in self._positions:
+            self._discard(cell)
+
+    def unblock(self, cell):
+        if cell in self._blocked:
+            self._blocked.discard(cell)
+            if cell not in self._counts:
+                self._positions[cell] = len(self._cells)
+                self._cells.append(cell)
+
+    def reorder(self, cells):
+        """Put the free cells in the given order, which must hold exactly the free cells"""
+        self._cells = list(cells)
+        self._positions = {cell: i for i, cell in enumerate(self._cells)}
+
+    def _discard(self, cell):
+        position = self._positions.pop(cell)
+        last_cell = self._cells.pop()
+        if last_cell is not cell:
+            self._cells[position] = last_cell
+            self._positions[last_cell] = position
+
+    def sample(self, random):
+        """A uniformly random free cell, or None if the grid is full"""
+        return random.choice(self._cells) if self._cells else None
@@ -0,0 +1,90 @@
+"""Vectorized anticipated criticality against a scalar reference.
+
+RobotBase.anticipated_criticality evaluates the piecewise rules of
+RobotBase._compute_anticipated_criticality on NumPy arrays. reference()
+below restates those rules for one robot/box pair in plain Python, and the
+tests compare both with it on random batteries, distances and colors,
+checking that every reachable branch is hit: the robot dies during the
+mission, the anticipated battery is clamped at max_battery, and the box
+earns the reduced reward. Robots of every reward rule are compared, dead
+(gray) ones included. (The last branch of the scalar version, an
+anticipated battery <= 0 for a robot that survives, needs a reward <= 0
+and cannot be reached with the current constants.)
+
+Run with python test_criticality.py or python -m pytest test_criticality.py.
+"""
+import numpy as np
+
+from agents.box import Box
+from agents.robot_base import RobotBase
+from model import CoCaRoModel
+
+TRIALS = 20_000
+
+
+def reference(battery, dist_box_to_me, dist_box_to_nest, same_color, robot_class=RobotBase):
+    """Anticipated criticality of one box, and the name of the rule that gave it"""
+    before_reward = max(battery - (dist_box_to_me + dist_box_to_nest) * robot_class.battery_consum, 0)
+    anticipated = before_reward + (robot_class.reward if same_color else robot_class.reduced_reward)
+    if before_reward <= 0:
+        return robot_class.max_criticality, "died"
+    if robot_class.min_battery < anticipated < robot_class.max_battery:
+        return robot_class.max_criticality - anticipated, "in range"
+    if anticipated >= robot_class.max_battery:
+        return robot_class.min_criticality, "clamped"
+    return robot_class.max_criticality, "empty"
+
+
+def test_rules_match_reference():
+    rng = np.random.default_rng(5)
+    battery = rng.integers(0, RobotBase.max_battery + 1, TRIALS)
+    dist_box_to_me = rng.integers(0, 150, TRIALS)
+    dist_box_to_nest = rng.integers(0, 150, TRIALS)
+    same_color = rng.random(TRIALS) < 0.5
+
+    vector = RobotBase.anticipated_criticality(battery, dist_box_to_me, dist_box_to_nest, same_color)
+    expected = [reference(*args) for args in zip(battery.tolist(), dist_box_to_me.tolist(),
+                                                 dist_box_to_nest.tolist(), same_color.tolist())]
+    assert np.array_equal(vector, [value for value, _ in expected])
+
+    branches = {branch for _, branch in expected}
+    assert {"died", "in range", "clamped"} <= branches, branches
+    reduced = ~same_color & (battery - dist_box_to_me - dist_box_to_nest > 0)
+    assert reduced.any()
+
+
+def test_robots_match_scalar_version():
+    rng = np.random.default_rng(11)
+    branches = set()
+    for robot_type in ("GREEDY", "COOPERATIVE", "SAPHESIA"):
+        model = CoCaRoModel(robot_type, robot_num=30, box_num=60, seed=int(rng.integers(1000)))
+        cells = model.grid.all_cells.cells
+        boxes = list(model.agents_by_type[Box])
+        robots = model.get_robots()
+        dead = robots[0]
+        if robot_type == "SAPHESIA":  # a helped color pays in full, even to a dead robot
+            dead.system.help_system(dead.system.linked_systems[0])
+        dead.color = "gray"  # dead robots lose the full reward of their own color
+        for robot in robots:
+            for _ in range(10):
+                robot.cell = cells[rng.integers(len(cells))]
+                robot.battery = int(rng.integers(0, robot.max_battery + 1))
+                vector = robot._compute_anticipated_criticalities(boxes)
+                scalar = [robot._compute_anticipated_criticality(box) for box in boxes]
+                assert np.array_equal(vector, scalar), f"robot {robot.unique_id}: {vector} != {scalar}"
+                for box, value in zip(boxes, scalar):
+                    full_reward = robot._colors_reward_efficiency(box.color) == robot.reward
+                    expected, branch = reference(
+                        robot.battery, abs(robot.cell.coordinate[0] - box.cell.coordinate[0])
+                        + abs(robot.cell.coordinate[1] - box.cell.coordinate[1]),
+                        model.nest_distance(box.color, box.cell.coordinate), full_reward, type(robot))
+                    assert value == expected
+                    branches.add((branch, full_reward))
+    assert {("died", True), ("in range", True), ("clamped", True), ("in range", False)} <= branches, branches
+
+
+# Test it
+if __name__ == "__main__":
+    test_rules_match_reference()
+    test_robots_match_scalar_version()
+    print("OK")
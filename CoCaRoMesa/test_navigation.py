@@ -0,0 +1,65 @@
+"""Robots, boxes and spawns around blocked cells.
+
+Run with python test_navigation.py or python -m pytest test_navigation.py.
+"""
+from agents.box import Box
+from model import CoCaRoModel
+
+# a wall across the middle of the default 50x50 grid, leaving a gap on each side
+WALL = [(x, y) for x in range(5, 46) for y in range(22, 29)]
+
+
+def test_robots_path_around_blocked_cells():
+    model = CoCaRoModel("GREEDY", robot_num=30, box_num=30, seed=3)
+    model.navigation.block([model.grid[(x, 25)] for x in range(2, 48)])
+    for _ in range(300):
+        model.step()
+        assert not any(model.navigation.is_blocked(robot.cell) for robot in model.get_robots())
+
+
+def test_nothing_placed_on_blocked_cells():
+    model = CoCaRoModel("GREEDY", robot_num=90, box_num=18, seed=3, blocked_cells=WALL)
+    assert not any(model.navigation.is_blocked(agent.cell) for agent in model.agents)
+    stuck = 0
+    for _ in range(600):
+        model.step()
+        assert not any(model.navigation.is_blocked(box.cell) for box in model.agents_by_type[Box])
+        assert not any(model.navigation.is_blocked(cell) for cell in model.free_cells)
+        # no robot keeps targeting a box it cannot reach
+        stuck += sum(1 for robot in model.get_robots() if robot.targeted_box is not None
+                     and model.navigation.distance(robot.cell, robot.targeted_box.cell) < 0)
+    assert stuck == 0, f"{stuck} robot-steps targeting unreachable boxes"
+
+
+def test_cells_blocked_after_placement():
+    # boxes already on the blocked cells are given up, new ones spawn elsewhere
+    model = CoCaRoModel("GREEDY", robot_num=90, box_num=18, seed=3)
+    model.navigation.block([model.grid[coordinate] for coordinate in WALL])
+    spawned_before = {box.unique_id for box in model.agents_by_type[Box]}
+    for _ in range(600):
+        model.step()
+        assert not any(model.navigation.is_blocked(box.cell) for box in model.agents_by_type[Box]
+                       if box.unique_id not in spawned_before)
+
+
+def test_walled_in_nest():
+    # robots drop boxes whose nest they cannot reach instead of holding them in place forever
+    nest_coordinate = (15, 15)
+    ring = [(15 + dx, 15 + dy) for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0))]
+    model = CoCaRoModel("GREEDY", robot_num=90, box_num=18, seed=3, blocked_cells=ring)
+    walled_color = next(color for color, nest in model.nest_by_color.items()
+                        if nest.cell.coordinate == nest_coordinate)
+    for _ in range(600):
+        model.step()
+        for robot in model.get_robots():
+            assert robot.carried_box is None or robot.carried_box.color != walled_color
+            assert robot.target_nest is None or robot.target_nest.color != walled_color
+
+
+# Test it
+if __name__ == "__main__":
+    test_robots_path_around_blocked_cells()
+    test_nothing_placed_on_blocked_cells()
+    test_cells_blocked_after_placement()
+    test_walled_in_nest()
+    print("OK")
@@ -0,0 +1,252 @@
+"""Vectorized, Gymnasium-style environment over CoCaRoModel runs of RL robots.
+
+VecCoCaRoEnv steps num_envs independent models in lockstep, every robot
+being an agent. Observations are the rl.py state features of each robot,
+batched as (envs, robots, FEATURE_NUM) arrays, rewards are its shaped rewards
+and actions are one integer per robot: -1 for none, a box-selection action
+(0 to ACTION_NUM - 1), or ACTION_NUM + k to step along rl.MOVES[k] instead of
+wandering. Actions only apply to robots free to take them (see
+QLearning.act); moving to, taking, carrying and dropping boxes is the RL
+robot's own behaviour. Dead robots observe zeros and get no reward.
+
+An episode ends when every robot is dead (terminated) or after max_steps
+(truncated). Like Gymnasium's vector envs, an ended env resets itself within
+the same step, with the next seed, and info["episode_done"] flags it. Resets
+reuse the env's grid instead of building a new one.
+
+With workers > 0 the envs are split across that many subprocesses, each
+stepping its share in lockstep with the others.
+
+Example:
+    python vec_env.py --envs 8 --workers 4 --steps 300
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+from model import CoCaRoModel
+from rl import ACTION_NUM, FEATURE_NUM, MOVES
+
+# box-selection actions, then moves
+ENV_ACTION_NUM = ACTION_NUM + len(MOVES)
+NO_ACTION = -1
+
+
+#  ===== SINGLE ENV =====
+class CoCaRoEnv:
+    """One CoCaRoModel run of RL robots, whose decisions come from outside"""
+
+    def __init__(self, robot_num=90, box_num=18, max_steps=500, rl_params=None, **model_params):
+        self.robot_num = robot_num
+        self.box_num = box_num
+        self.max_steps = max_steps
+        self.rl_params = dict(rl_params or {}, external=True)
+        # reporters are not needed for training, collect once per episode
+        model_params.setdefault("collect_interval", max_steps)
+        self.model_params = model_params
+        self.model = None
+        self.episode_return = 0.0
+        self._grid = None
+        self._observation = None
+
+    def reset(self, seed=None):
+        """Start a new episode, return the robots' observations"""
+        self.model = CoCaRoModel("RL", self.robot_num, self.box_num, seed=seed, rl_params=self.rl_params,
+                                 grid=self._grid, **self.model_params)
+        self._grid = self.model.grid
+        self.episode_return = 0.0
+        observations, _, _ = self._observe()
+        return observations
+
+    def step(self, actions):
+        """Apply one action per robot (in creation order) and step the model
+
+        Returns the observations, rewards and dead flags of every robot, and
+        whether the episode hit max_steps.
+        """
+        if self._observation is not None:
+            self.model.q_learning.act(self._observation, np.asarray(actions)[self._observation.rows])
+        self.model.step()
+        observations, rewards, dead = self._observe()
+        self.episode_return += float(rewards.sum())
+        return observations, rewards, dead, self.model.steps >= self.max_steps
+
+    def _observe(self):
+        observation = self.model.q_learning.observe()
+        self._observation = observation
+        observations = np.zeros((self.robot_num, FEATURE_NUM))
+        rewards = np.zeros(self.robot_num)
+        dead = np.ones(self.robot_num, dtype=bool)
+        if observation is not None:
+            observations[observation.rows] = observation.features
+            rewards[observation.rows] = observation.reward
+            dead[observation.rows] = False
+        return observations, rewards, dead
+
+
+class _EnvGroup:
+    """Envs stepped one after the other in one process, resetting those whose episode ended"""
+
+    def __init__(self, num_envs, env_params):
+        self.envs = [CoCaRoEnv(**env_params) for _ in range(num_envs)]
+        self.seeds = [None] * num_envs
+        self.seed_stride = 0
+
+    def reset(self, seeds, seed_stride):
+        """Reset every env; after an episode ends, an env's seed grows by seed_stride"""
+        self.seeds, self.seed_stride = list(seeds), seed_stride
+        return np.stack([env.reset(seed) for env, seed in zip(self.envs, self.seeds)])
+
+    def step(self, actions):
+        n = len(self.envs)
+        observations = np.zeros((n, self.envs[0].robot_num, FEATURE_NUM))
+        rewards = np.zeros((n, self.envs[0].robot_num))
+        dead = np.zeros((n, self.envs[0].robot_num), dtype=bool)
+        truncated = np.zeros(n, dtype=bool)
+        episode_returns = np.full(n, np.nan)
+        for i, env in enumerate(self.envs):
+            observations[i], rewards[i], dead[i], truncated[i] = env.step(actions[i])
+            if truncated[i] or dead[i].all():
+                episode_returns[i] = env.episode_return
+                if self.seeds[i] is not None:
+                    self.seeds[i] += self.seed_stride
+                observations[i] = env.reset(self.seeds[i])
+        return observations, rewards, dead, truncated, episode_returns
+
+
+def _worker(connection, num_envs, env_params):
+    """Serve reset and step commands for a group of envs until told to close"""
+    group = _EnvGroup(num_envs, env_params)
+    while True:
+        command, data = connection.recv()
+        if command == "reset":
+            connection.send(group.reset(*data))
+        elif command == "step":
+            connection.send(group.step(data))
+        else:
+            break
+    connection.close()
+
+
+#  ===== VECTORIZED ENV =====
+class VecCoCaRoEnv:
+    """num_envs CoCaRoEnvs stepped in lockstep, in this process or in workers subprocesses"""
+
+    def __init__(self, num_envs, robot_num=90, box_num=18, max_steps=500, workers=0, **model_params):
+        self.num_envs = num_envs
+        self.robot_num = robot_num
+        self.single_observation_shape = (robot_num, FEATURE_NUM)
+        self.action_num = ENV_ACTION_NUM
+        env_params = dict(model_params, robot_num=robot_num, box_num=box_num, max_steps=max_steps)
+
+        # contiguous share of the envs per worker
+        workers = min(workers, num_envs)
+        self._bounds = np.linspace(0, num_envs, max(workers, 1) + 1).astype(int)
+        self._group = None
+        self._connections, self._processes = [], []
+        if workers:
+            for start, stop in zip(self._bounds[:-1], self._bounds[1:]):
+                connection, worker_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_worker, args=(worker_connection, stop - start, env_params),
+                                                  daemon=True)
+                process.start()
+                worker_connection.close()
+                self._connections.append(connection)
+                self._processes.append(process)
+        else:
+            self._group = _EnvGroup(num_envs, env_params)
+
+    def reset(self, seed=None, options=None):
+        """Reset every env, env i with seed + i; return (observations, info)"""
+        seeds = [None] * self.num_envs if seed is None else [seed + i for i in range(self.num_envs)]
+        if self._group is not None:
+            observations = self._group.reset(seeds, self.num_envs)
+        else:
+            for connection, start, stop in zip(self._connections, self._bounds[:-1], self._bounds[1:]):
+                connection.send(("reset", (seeds[start:stop], self.num_envs)))
+            observations = np.concatenate([connection.recv() for connection in self._connections])
+        return observations, {}
+
+    def step(self, actions):
+        """Apply (envs, robots) actions; return observations, rewards, terminated, truncated and info
+
+        terminated flags dead robots, truncated the robots of envs that hit
+        max_steps. info["episode_done"] flags the envs that reset during this
+        step, whose observations are then those of the new episode, and
+        info["episode_return"] holds the total reward of their ended episode.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        if actions.shape != (self.num_envs, self.robot_num):
+            raise ValueError(f"expected actions of shape {(self.num_envs, self.robot_num)}, got {actions.shape}")
+        if self._group is not None:
+            results = self._group.step(actions)
+        else:
+            for connection, start, stop in zip(self._connections, self._bounds[:-1], self._bounds[1:]):
+                connection.send(("step", actions[start:stop]))
+            parts = [connection.recv() for connection in self._connections]
+            results = [np.concatenate(arrays) for arrays in zip(*parts)]
+        observations, rewards, terminated, truncated, episode_returns = results
+        info = {"episode_done": ~np.isnan(episode_returns), "episode_return": episode_returns}
+        truncated = np.repeat(truncated[:, None], self.robot_num, axis=1)
+        return observations, rewards, terminated, truncated, info
+
+    def close(self):
+        for connection in self._connections:
+            connection.send(("close", None))
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+
+
+def measure_throughput(env, steps, seed=0):
+    """Env steps per second under a uniformly random policy"""
+    rng = np.random.default_rng(seed)
+    env.reset(seed=seed)
+    start = time.perf_counter()
+    for _ in range(steps):
+        actions = rng.integers(NO_ACTION, env.action_num, (env.num_envs, env.robot_num))
+        env.step(actions)
+    return env.num_envs * steps / (time.perf_counter() - start)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of the vectorized CoCaRo environment")
+    parser.add_argument("--envs", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=0, help="subprocesses, 0 to step every env in this process")
+    parser.add_argument("--robot-num", type=int, default=90)
+    parser.add_argument("--box-num", type=int, default=18)
+    parser.add_argument("--max-steps", type=int, default=300)
+    parser.add_argument("--steps", type=int, default=300, help="vectorized steps to time")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+# Test it
+if __name__ == "__main__":
+    args = parse_args()
+
+    # a reset with the same seed replays the episode, on a reused grid as on a new one
+    print("=== Reset check ===")
+    rng = np.random.default_rng(1)
+    actions = rng.integers(NO_ACTION, ENV_ACTION_NUM, (60, 2, 30))
+    trajectories = []
+    for env in (VecCoCaRoEnv(2, robot_num=30, box_num=10), VecCoCaRoEnv(2, robot_num=30, box_num=10)):
+        for _ in range(1 + len(trajectories)):  # the second env's grids are reused
+            observations, _ = env.reset(seed=7)
+            trajectory = [observations]
+            for step_actions in actions:
+                observations, rewards, _, _, _ = env.step(step_actions)
+                trajectory += [observations, rewards]
+        trajectories.append(trajectory)
+    assert all(np.array_equal(a, b) for a, b in zip(*trajectories))
+    print("OK")
+
+    print(f"\n=== Throughput: {args.envs} envs x {args.robot_num} robots ===")
+    for workers in sorted({0, args.workers}):
+        env = VecCoCaRoEnv(args.envs, robot_num=args.robot_num, box_num=args.box_num, max_steps=args.max_steps,
+                           workers=workers)
+        rate = measure_throughput(env, args.steps, args.seed)
+        env.close()
+        print(f"workers {workers}: {rate:8.1f} env-steps/s, {rate * args.robot_num:10.0f} robot-steps/s")